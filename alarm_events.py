@@ -0,0 +1,237 @@
+"""
+Alarm trigger-latency history
+
+Every firing records when the alarm was due, when check_alarms_loop
+noticed it, when start_alarm_sound had started the sound and when audio
+actually began;
+snooze and dismiss are recorded with their source. Rows are appended to
+the alarm_events table by a writer thread fed through a bounded queue, so
+the alarm path never waits on SQLite.
+"""
+import queue
+import threading
+from datetime import datetime, timedelta
+from database import get_db
+from metrics import registry
+
+EVENT_QUEUE_SIZE = 1000  # Bei vollem Queue werden Events verworfen statt zu blockieren
+WRITER_BATCH_SIZE = 100
+LATENCY_STAGES = ('notice_ms', 'sound_ms', 'audio_ms')
+PERCENTILES = (50, 90, 95, 99)
+
+# Event types and sources
+EVENT_TRIGGERED = 'triggered'
+EVENT_SNOOZED = 'snoozed'
+EVENT_DISMISSED = 'dismissed'
+SOURCE_SCHEDULER = 'scheduler'
+SOURCE_BUTTON = 'button'
+SOURCE_API = 'api'
+SOURCE_AUTO = 'auto'
+
+_STOP = object()
+
+registry.describe('wecker_alarm_latency_seconds', 'histogram', 'Delay from alarm due time to each firing stage')
+registry.describe('wecker_alarm_events_dropped_total', 'counter', 'Alarm events dropped because the write queue was full')
+
+
+def _ms(start, end):
+    return round((end - start).total_seconds() * 1000, 3) if start and end else None
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, -(-len(sorted_values) * pct // 100) - 1)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class AlarmEventLog:
+    def __init__(self, queue_size=EVENT_QUEUE_SIZE):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = {}  # alarm_id -> Auslösung, die noch auf Sound- oder Audio-Start wartet
+        self._lock = threading.Lock()
+        self.dropped = 0
+        self._writer = None
+
+    def start(self):
+        """Start the writer thread; events queue up until then"""
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name='alarm-events', daemon=True)
+            self._writer.start()
+
+    def triggered(self, alarm, due_at, noticed_at):
+        """Start a firing record; it is written once sound and audio started or the alarm stops
+
+        Call before start_alarm_sound, which may report the audio start synchronously.
+        """
+        firing = {
+            'alarm_id': alarm.id,
+            'user_id': alarm.user_id,
+            'event': EVENT_TRIGGERED,
+            'source': SOURCE_SCHEDULER,
+            'due_at': due_at,
+            'noticed_at': noticed_at,
+            'sound_started_at': None,
+            'audio_started_at': None,
+            'created_at': noticed_at
+        }
+        with self._lock:
+            previous = self._pending.pop(alarm.id, None)
+            self._pending[alarm.id] = firing
+        if previous:
+            self._enqueue(previous)
+
+    def sound_started(self, alarm, started_at=None):
+        """start_alarm_sound returned (including decode/mixer start-up)"""
+        started_at = started_at or datetime.now()
+        with self._lock:
+            firing = self._pending.get(alarm.id)
+            if firing is None:
+                return
+            firing['sound_started_at'] = started_at
+            if firing['audio_started_at'] is None:
+                return
+            del self._pending[alarm.id]
+        self._enqueue(firing)
+
+    def audio_started(self, started_at=None):
+        """Audio output began (HardwareController callback); completes the pending firings"""
+        started_at = started_at or datetime.now()
+        with self._lock:
+            firings = []
+            for firing in list(self._pending.values()):
+                if firing['audio_started_at'] is None:
+                    firing['audio_started_at'] = started_at
+                # Kann schon während start_alarm_sound kommen, dann schließt sound_started ab
+                if firing['sound_started_at']:
+                    firings.append(firing)
+                    del self._pending[firing['alarm_id']]
+        for firing in firings:
+            self._enqueue(firing)
+
+    def stopped(self, alarm, event, source):
+        """Record a snooze or dismiss (source: button, api or auto)"""
+        now = datetime.now()
+        with self._lock:
+            firing = self._pending.pop(alarm.id, None)
+        if firing:
+            self._enqueue(firing)  # Ohne Audio-Start (z.B. Simulationsmodus)
+        self._enqueue({
+            'alarm_id': alarm.id,
+            'user_id': alarm.user_id,
+            'event': event,
+            'source': source,
+            'created_at': now
+        })
+
+    def flush_pending(self):
+        """Write firings still waiting for audio (e.g. on shutdown)"""
+        with self._lock:
+            firings = list(self._pending.values())
+            self._pending.clear()
+        for firing in firings:
+            self._enqueue(firing)
+
+    def shutdown(self, timeout=2):
+        self.flush_pending()
+        if self._writer is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._writer.join(timeout)
+
+    def _enqueue(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            registry.inc('wecker_alarm_events_dropped_total')
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITER_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = _STOP in batch
+            events = [event for event in batch if event is not _STOP]
+            if events:
+                try:
+                    self._write(events)
+                except Exception as e:
+                    print(f"Error writing alarm events: {e}")
+            if stop:
+                return
+
+    def _write(self, events):
+        rows = []
+        for event in events:
+            due_at = event.get('due_at')
+            latencies = {stage: _ms(due_at, event.get(column)) for stage, column in
+                         zip(LATENCY_STAGES, ('noticed_at', 'sound_started_at', 'audio_started_at'))}
+            for stage, value in latencies.items():
+                if value is not None:
+                    registry.observe('wecker_alarm_latency_seconds', max(value, 0) / 1000,
+                                     labels=(('stage', stage[:-3]),))
+            rows.append((
+                event['alarm_id'], event['user_id'], event['event'], event['source'],
+                *(event.get(key) and event[key].isoformat() for key in
+                  ('due_at', 'noticed_at', 'sound_started_at', 'audio_started_at')),
+                latencies['notice_ms'], latencies['sound_ms'], latencies['audio_ms'],
+                event['created_at'].isoformat()
+            ))
+
+        conn = get_db()
+        conn.executemany('''
+            INSERT INTO alarm_events (alarm_id, user_id, event, source, due_at, noticed_at,
+                                      sound_started_at, audio_started_at, notice_ms, sound_ms,
+                                      audio_ms, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        conn.close()
+
+    def recent(self, user_id=None, limit=50):
+        """Get the newest events (optionally of one user's alarms)"""
+        conn = get_db()
+        cursor = conn.cursor()
+        if user_id is None:
+            cursor.execute('SELECT * FROM alarm_events ORDER BY id DESC LIMIT ?', (limit,))
+        else:
+            cursor.execute('''
+                SELECT * FROM alarm_events WHERE user_id = ? ORDER BY id DESC LIMIT ?
+            ''', (user_id, limit))
+        events = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return events
+
+    def latency_stats(self, since=None, user_id=None):
+        """Percentiles of the trigger latencies (ms after the due time) since a point in time"""
+        since = since or datetime.now() - timedelta(days=7)
+        sql = 'SELECT notice_ms, sound_ms, audio_ms FROM alarm_events WHERE event = ? AND created_at >= ?'
+        params = [EVENT_TRIGGERED, since.isoformat()]
+        if user_id is not None:
+            sql += ' AND user_id = ?'
+            params.append(user_id)
+
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        conn.close()
+
+        stats = {'since': since.isoformat(timespec='seconds'), 'firings': len(rows)}
+        for stage in LATENCY_STAGES:
+            values = sorted(row[stage] for row in rows if row[stage] is not None)
+            stats[stage] = {
+                'count': len(values),
+                **{f'p{pct}': percentile(values, pct) for pct in PERCENTILES},
+                'max': values[-1] if values else None
+            }
+        return stats
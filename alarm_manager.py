@@ -2,6 +2,7 @@
 Alarm management system
 """
 from datetime import datetime, timedelta
+from functools import lru_cache
 import json
 import os
 from threading import Lock
@@ -10,11 +11,71 @@ from config import SNOOZE_DURATION_MINUTES, MAX_ALARMS
 ALARMS_FILE = 'alarms.json'
 
 
-class Alarm:
+ALL_DAYS = 0b1111111   # Bit n = Wochentag n (0=Montag)
+WINDOW_US = 60 * 1000000  # Auslösefenster: 1 Minute in Mikrosekunden
+
+
+@lru_cache(maxsize=2048)
+def parse_alarm_time(time_str):
+    """Parse "HH:MM" into minutes since midnight (None if invalid or out of range)"""
+    try:
+        hour, minute = map(int, time_str.split(':'))
+    except (AttributeError, ValueError):
+        return None
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        return None
+    return hour * 60 + minute
+
+
+def weekday_mask(days):
+    """Build the weekday bitmask of a day list (empty = every day)"""
+    if not days:
+        return ALL_DAYS
+    mask = 0
+    for day in days:
+        if isinstance(day, int) and 0 <= day <= 6:
+            mask |= 1 << day
+    return mask
+
+
+class AlarmTime:
+    """Alarm time and weekdays, parsed once into integers for cheap checks"""
+    __slots__ = ('_time_str', '_days', 'minute_of_day', 'day_mask')
+
+    @property
+    def time_str(self):
+        return self._time_str
+
+    @time_str.setter
+    def time_str(self, value):
+        self._time_str = value
+        self.minute_of_day = parse_alarm_time(value)
+
+    @property
+    def days(self):
+        return self._days
+
+    @days.setter
+    def days(self, value):
+        self._days = value if value else []
+        self.day_mask = weekday_mask(self._days)
+
+    def in_window(self, current_time):
+        """Check weekday and the one-minute window around today's alarm time"""
+        if self.minute_of_day is None or not (self.day_mask >> current_time.weekday()) & 1:
+            return False
+        now_us = ((current_time.hour * 60 + current_time.minute) * 60 + current_time.second) \
+            * 1000000 + current_time.microsecond
+        return abs(now_us - self.minute_of_day * WINDOW_US) <= WINDOW_US
+
+
+class Alarm(AlarmTime):
+    __slots__ = ('id', 'enabled', 'label', 'snooze_until', 'last_triggered')
+
     def __init__(self, alarm_id, time_str, days=None, enabled=True, label=""):
         self.id = alarm_id
         self.time_str = time_str  # Format: "HH:MM"
-        self.days = days if days else []  # List of weekday numbers (0=Monday, 6=Sunday)
+        self.days = days  # List of weekday numbers (0=Monday, 6=Sunday)
         self.enabled = enabled
         self.label = label
         self.snooze_until = None
@@ -60,19 +121,8 @@ class Alarm:
         if self.snooze_until and current_time < self.snooze_until:
             return False
         
-        # Parse alarm time
-        hour, minute = map(int, self.time_str.split(':'))
-        alarm_time = current_time.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        
-        # Check if it's the right day
-        if self.days:
-            weekday = current_time.weekday()  # 0=Monday, 6=Sunday
-            if weekday not in self.days:
-                return False
-        
-        # Check if time matches (within 1 minute window)
-        time_diff = abs((current_time - alarm_time).total_seconds())
-        if time_diff <= 60:  # 1 minute window
+        # Check day and time (within 1 minute window)
+        if self.in_window(current_time):
             # Check if we already triggered this alarm today
             if self.last_triggered:
                 if self.last_triggered.date() == current_time.date():
@@ -0,0 +1,128 @@
+"""
+Event-driven alarm scheduler
+
+Keeps a priority queue with the next occurrence of every alarm (including
+snooze deadlines) and sleeps until the earliest one is due instead of
+polling the database every second. The queue is loaded from the indexed
+next_fire_at column, and every dispatched occurrence is written back so the
+stored value always points at the next one.
+"""
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+# Spätestens nach dieser Zeit neu synchronisieren (Systemzeit-Änderungen, NTP, externe DB-Änderungen)
+MAX_SLEEP_SECONDS = 60
+
+
+class AlarmScheduler:
+    def __init__(self, alarm_manager, max_sleep=MAX_SLEEP_SECONDS):
+        self.alarm_manager = alarm_manager
+        self.max_sleep = max_sleep
+        self._heap = []  # (fire_at, alarm_id)
+        self._fired = {}  # alarm_id -> zuletzt ausgelöstes Vorkommen
+        self._dirty = True
+        self._condition = threading.Condition()
+        self.last_lateness = None  # Sekunden zwischen Fälligkeit und Aufwachen (letzter fälliger Eintrag)
+        self.due_times = {}  # alarm_id -> Fälligkeit der zuletzt zurückgegebenen Alarme
+
+    def notify(self):
+        """Alarms changed - rebuild the queue and wake the waiting thread"""
+        with self._condition:
+            self._dirty = True
+            self._condition.notify_all()
+
+    def next_fire_time(self):
+        """Get the earliest scheduled occurrence (or None)"""
+        with self._condition:
+            return self._heap[0][0] if self._heap else None
+
+    def upcoming(self, limit=5):
+        """Get the next scheduled (fire_at, alarm_id) entries in order"""
+        with self._condition:
+            return heapq.nsmallest(limit, self._heap)
+
+    def wait_for_due(self, timeout=None):
+        """Block until the earliest alarm is due or alarms change
+
+        Returns the alarms that should trigger now (usually an empty list
+        when woken by notify()).
+        """
+        with self._condition:
+            if self._dirty:
+                self._rebuild(datetime.now())
+
+            now = datetime.now()
+            if not self._heap or self._heap[0][0] > now:
+                sleep = self.max_sleep
+                if self._heap:
+                    sleep = min(sleep, (self._heap[0][0] - now).total_seconds())
+                if timeout is not None:
+                    sleep = min(sleep, timeout)
+
+                notified = self._condition.wait(max(sleep, 0))
+                if not notified and sleep >= self.max_sleep:
+                    # Nichts fällig, regelmäßige Neusynchronisierung
+                    self._dirty = True
+                if self._dirty:
+                    self._rebuild(datetime.now())
+
+            return self._pop_due(datetime.now())
+
+    def _rebuild(self, now):
+        """Load the next occurrence of every alarm from next_fire_at"""
+        # Verstrichene Vorkommen (z.B. nicht ausgelöst, weil ausgeschaltet) zuerst weiterschieben
+        self.alarm_manager.refresh_next_fire(now, missing=True)
+        heap = []
+        for fire_at, alarm_id in self.alarm_manager.fire_times():
+            fired = self._fired.get(alarm_id)
+            if fired and fire_at <= fired:
+                # Schon ausgelöst, aber noch nicht zurückgeschrieben
+                alarm = self.alarm_manager.get_alarm(alarm_id)
+                fire_at = self._next_fire(alarm, now) if alarm else None
+                if not fire_at:
+                    continue
+            heap.append((fire_at, alarm_id))
+        heapq.heapify(heap)
+
+        alarm_ids = {alarm_id for _, alarm_id in heap}
+        self._heap = heap
+        self._fired = {k: v for k, v in self._fired.items() if k in alarm_ids}
+        self._dirty = False
+
+    def _next_fire(self, alarm, after):
+        """Next occurrence of an alarm that has not been dispatched yet"""
+        return alarm.next_undispatched(after, self._fired.get(alarm.id))
+
+    def _pop_due(self, now):
+        """Pop all due entries and return the alarms that trigger"""
+        triggered = []
+        dispatched = {}
+        self.last_lateness = None
+        self.due_times = {}
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, alarm_id = heapq.heappop(self._heap)
+            if self.last_lateness is None:
+                self.last_lateness = (now - fire_at).total_seconds()
+            alarm = self.alarm_manager.get_alarm(alarm_id)
+            if not alarm:
+                continue
+
+            self._fired[alarm_id] = fire_at
+            dispatched[alarm_id] = fire_at
+            if alarm.should_trigger(now):
+                triggered.append(alarm)
+                self.due_times[alarm_id] = fire_at
+
+            next_fire = self._next_fire(alarm, now)
+            if next_fire:
+                heapq.heappush(self._heap, (next_fire, alarm_id))
+
+        if dispatched:
+            # next_fire_at auf das folgende Vorkommen setzen (für next_alarm und den nächsten Rebuild)
+            try:
+                self.alarm_manager.advance_next_fire(dispatched, now)
+            except Exception as e:
+                print(f"Error storing next alarm occurrence: {e}")
+
+        return triggered
@@ -1,28 +1,57 @@
 """
 Raspberry Pi Wecker - Main Application
 Web server with authentication, roles, REST API and web interface
+
+create_app() initializes database, managers and hardware;
+start_background_workers() starts the alarm/display threads and the
+audio warm-up. Importing this module has no side effects beyond that.
 """
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory
+import time
+
+IMPORT_STARTED = time.perf_counter()  # Beginn der Phase "imports" im Startup-Bericht
+
+from flask import Flask, Request, Response, g, render_template, request, jsonify, session, redirect, url_for, send_from_directory
 from functools import wraps
 from datetime import datetime, timedelta
 from functools import wraps
 import threading
-import time
 import atexit
 import os
-from config import WEB_PORT, WEB_HOST, DEBUG_MODE
+import queue
+import re
+import zlib
+from contextlib import contextmanager
+from werkzeug.exceptions import RequestEntityTooLarge
+from config import WEB_PORT, WEB_HOST, DEBUG_MODE, SOUND_PRELOAD_ALARMS, MAX_SOUND_UPLOAD_BYTES, \
+    SSE_MAX_CONNECTIONS
 
 # CORS für API-Zugriff von überall
 from flask_cors import CORS
 
-from database import UserManager, SessionManager, SettingsManager
+from database import UserManager, SessionManager, SettingsManager, init_database, close_all_connections
 from db_alarm_manager import DBAlarmManager
+from alarm_scheduler import AlarmScheduler
+from event_bus import EventBus, format_sse
 from display_controller import TM1637Display
 from hardware_controller import HardwareController
-from sound_manager import SoundManager, SOUNDS_DIR
+from sound_manager import SoundManager, HashingUpload, SOUNDS_DIR
+from metrics import registry as metrics_registry, observe_request, observe_loop
+from profiler import Profiler, PSTATS_SORT_KEYS
+from alarm_events import (AlarmEventLog, EVENT_SNOOZED, EVENT_DISMISSED, SOURCE_BUTTON, SOURCE_API,
+                          SOURCE_AUTO)
+
+
+class UploadRequest(Request):
+    """Request that streams file uploads through HashingUpload"""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingUpload()
+
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.secret_key = os.urandom(24)  # Change this in production!
+# Zu große Uploads anhand von Content-Length ablehnen, bevor etwas gelesen wird
+app.config['MAX_CONTENT_LENGTH'] = MAX_SOUND_UPLOAD_BYTES + 64 * 1024  # + Multipart-Overhead
 
 # Session-Konfiguration für Cross-Origin-Zugriff
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'  # Oder 'None' für Cross-Origin
@@ -50,12 +79,28 @@ try:
 except ImportError:
     print("Warning: flask-cors not installed. CORS disabled. Install with: pip install flask-cors")
 
-# Initialize components
-user_manager = UserManager()
-session_manager = SessionManager()
-settings_manager = SettingsManager()
-alarm_manager = DBAlarmManager()
-sound_manager = SoundManager()
+# Components (created by create_app, background threads by start_background_workers)
+user_manager = None
+session_manager = None
+settings_manager = None
+alarm_manager = None
+sound_manager = None
+alarm_scheduler = None
+alarm_events = None
+workers_started = False
+event_bus = EventBus()
+profiler = Profiler()
+startup_timings = {}  # Phase -> Sekunden (Startup-Bericht und /api/metrics)
+
+SSE_HEARTBEAT_SECONDS = 15  # Keepalive-Kommentar und Session-Prüfung im Event-Stream
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+# Tunnel/Reverse-Proxy auf dem Pi (ngrok, cloudflared, nginx) verbinden sich ebenfalls von localhost
+PROXY_HEADERS = ('X-Forwarded-For', 'Forwarded', 'X-Real-IP', 'CF-Connecting-IP')
+
+metrics_registry.callback('wecker_sse_subscribers', 'gauge', 'Connected event stream clients',
+                          event_bus.subscriber_count)
+metrics_registry.callback('wecker_startup_phase_seconds', 'gauge', 'Duration of each startup phase',
+                          lambda: [((('phase', phase),), seconds) for phase, seconds in startup_timings.items()])
 
 display = None
 hardware = None
@@ -63,69 +108,163 @@ alarm_check_thread = None
 display_update_thread = None
 running = True
 active_alarm = None
+upcoming_sound_files = {}  # alarm_id -> (sound_file, Pfad) der nächsten Alarme
 
-# Initialize hardware components independently
-try:
-    print("Initializing Display...")
-    display = TM1637Display()
-    print("Display initialized successfully.")
-except Exception as e:
-    print(f"Warning: Could not initialize Display: {e}")
-    display = None
 
-try:
-    print("Initializing Hardware Controller (Button/Sound)...")
-    hardware = HardwareController(button_callback=handle_button_press)
-    print("Hardware Controller initialized successfully.")
-except Exception as e:
-    print(f"Warning: Could not initialize Hardware Controller: {e}")
-    hardware = None
+def status_snapshot():
+    """Get the hardware/active alarm state pushed to event stream clients"""
+    return {
+        'active_alarm': active_alarm.to_dict() if active_alarm else None,
+        'hardware_available': display is not None and hardware is not None,
+        'sound_playing': bool(hardware and hardware.sound_playing)
+    }
+
+
+def notify_alarm_change(event, alarm_id, user_id, data=None):
+    """Wake the scheduler and push an alarm change to event stream clients"""
+    alarm_scheduler.notify()
+    event_bus.publish(event, data or {'id': alarm_id}, user_id=user_id)
 
-if not display and not hardware:
-    print("Running in simulation mode (NO hardware detected)")
-else:
-    print(f"Hardware status: Display={'OK' if display else 'FAIL'}, Hardware={'OK' if hardware else 'FAIL'}")
+
+def publish_active_alarm(state):
+    """Push an active alarm transition (triggered/snoozed/dismissed)"""
+    event_bus.publish('active_alarm', {
+        'state': state,
+        'active_alarm': active_alarm.to_dict() if active_alarm else None
+    })
+    event_bus.publish('status', status_snapshot())
+
+
+def data_etag(scope):
+    """Build the ETag of the current data version as seen by the requesting user"""
+    user = request.current_user
+    return f"{scope}-{event_bus.version}.{alarm_manager.data_generation()}-{user['id']}.{user['role']}"
+
+
+def conditional_json(etag, payload):
+    """JSON response carrying an ETag that the client must revalidate"""
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified(etag):
+    """Return a 304 response if the client already has this version"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return None
 
 
 def handle_button_press():
     """Handle button press - dismiss active alarm"""
     global active_alarm
     if active_alarm:
-        alarm_manager.dismiss_alarm(active_alarm.id)
+        alarm = active_alarm
+        alarm_manager.dismiss_alarm(alarm.id)
         if hardware:
             hardware.stop_sound()
         active_alarm = None
+        alarm_events.stopped(alarm, EVENT_DISMISSED, SOURCE_BUTTON)
+        notify_alarm_change('alarm_dismissed', alarm.id, alarm.user_id)
+        publish_active_alarm('dismissed')
         print("Alarm dismissed via button")
 
 
+def init_display():
+    """Create the TM1637 display (None if it is not available)"""
+    try:
+        print("Initializing Display...")
+        display = TM1637Display()
+        print("Display initialized successfully.")
+        return display
+    except Exception as e:
+        print(f"Warning: Could not initialize Display: {e}")
+        return None
+
+
+def init_hardware():
+    """Create the button/sound controller (None if it is not available)"""
+    try:
+        print("Initializing Hardware Controller (Button/Sound)...")
+        hardware = HardwareController(button_callback=handle_button_press,
+                                      audio_started_callback=alarm_events.audio_started)
+        print("Hardware Controller initialized successfully.")
+        return hardware
+    except Exception as e:
+        print(f"Warning: Could not initialize Hardware Controller: {e}")
+        return None
+
+
+def resolve_sound_file(alarm):
+    """Get the file path of an alarm's custom sound (or None)"""
+    if not alarm.sound_file:
+        return None
+    
+    cached = upcoming_sound_files.get(alarm.id)
+    if cached and cached[0] == alarm.sound_file:
+        return cached[1]
+    
+    try:
+        sound_id = int(alarm.sound_file) if isinstance(alarm.sound_file, str) and alarm.sound_file.isdigit() else alarm.sound_file
+        sound_info = sound_manager.get_sound(sound_id)
+        if sound_info:
+            # Normalisierte Fassung bevorzugen, sonst das Original
+            for path in (sound_info['playback_filepath'], sound_info['filepath']):
+                if os.path.exists(path):
+                    return path
+    except (ValueError, TypeError) as e:
+        print(f"Error loading sound file: {e}")
+    return None
+
+
+def preload_upcoming_sounds():
+    """Resolve and decode the sounds of the next alarms ahead of time"""
+    global upcoming_sound_files
+    if not hardware:
+        return
+    
+    resolved = {}
+    for _, alarm_id in alarm_scheduler.upcoming(SOUND_PRELOAD_ALARMS):
+        alarm = alarm_manager.get_alarm(alarm_id)
+        path = resolve_sound_file(alarm) if alarm else None
+        if path:
+            resolved[alarm_id] = (alarm.sound_file, path)
+    upcoming_sound_files = resolved
+    hardware.sound_cache.preload([path for _, path in resolved.values()])
+
+
 def check_alarms_loop():
     """Background thread to check for alarms"""
     global active_alarm, running
     
     while running:
+        profile = None
         try:
-            current_time = datetime.now()
-            triggered = alarm_manager.check_alarms(current_time)
+            # Schläft bis zum nächsten fälligen Alarm oder bis sich Alarme ändern
+            triggered = alarm_scheduler.wait_for_due()
+            profile = profiler.begin_loop('check_alarms')
+            started = time.perf_counter()
+            noticed_at = datetime.now()
             
             # Handle triggered alarms
             for alarm in triggered:
                 if active_alarm is None or active_alarm.id != alarm.id:
                     active_alarm = alarm
                     print(f"Alarm triggered: {alarm.label or alarm.time_str}")
+                    # Vor start_alarm_sound, der Audio-Start kann synchron gemeldet werden
+                    alarm_events.triggered(alarm, alarm_scheduler.due_times.get(alarm.id), noticed_at)
                     
                     if hardware:
                         # Get sound file path if custom sound is set
-                        sound_file = None
-                        if alarm.sound_file:
-                            try:
-                                sound_id = int(alarm.sound_file) if isinstance(alarm.sound_file, str) and alarm.sound_file.isdigit() else alarm.sound_file
-                                sound_info = sound_manager.get_sound(sound_id)
-                                if sound_info and os.path.exists(sound_info['filepath']):
-                                    sound_file = sound_info['filepath']
-                            except (ValueError, TypeError) as e:
-                                print(f"Error loading sound file: {e}")
-                        
-                        hardware.start_alarm_sound(sound_file=sound_file)
+                        hardware.start_alarm_sound(sound_file=resolve_sound_file(alarm))
+                        # Erst nach dem Start, damit sound_ms die Start-Kosten enthält
+                        alarm_events.sound_started(alarm)
+                    
+                    publish_active_alarm('triggered')
             
             # Check if active alarm should stop
             if active_alarm:
@@ -134,23 +273,35 @@ def check_alarms_loop():
                     if alarm_obj.snooze_until and datetime.now() < alarm_obj.snooze_until:
                         if hardware:
                             hardware.stop_sound()
+                        # Der Scheduler löst nach Ablauf des Snooze erneut aus
+                        active_alarm = None
+                        alarm_events.stopped(alarm_obj, EVENT_SNOOZED, SOURCE_AUTO)
+                        publish_active_alarm('snoozed')
                     elif alarm_obj.last_triggered and alarm_obj.last_triggered.date() == datetime.now().date():
                         if hardware:
                             hardware.stop_sound()
                         active_alarm = None
+                        alarm_events.stopped(alarm_obj, EVENT_DISMISSED, SOURCE_AUTO)
+                        publish_active_alarm('dismissed')
             
-            time.sleep(1)
+            preload_upcoming_sounds()
+            observe_loop('check_alarms', time.perf_counter() - started, alarm_scheduler.last_lateness)
         except Exception as e:
             print(f"Error in alarm check loop: {e}")
             time.sleep(5)
+        finally:
+            profiler.end(profile)
 
 
 def update_display_loop():
     """Background thread to update display"""
     global running, active_alarm
     
+    next_wake = None  # Geplanter Aufwachzeitpunkt (perf_counter) für die Drift-Messung
     while running:
+        profile = profiler.begin_loop('update_display')
         try:
+            started = time.perf_counter()
             if display:
                 current_time = datetime.now()
                 
@@ -172,34 +323,118 @@ def update_display_loop():
                         colon=(int(time.time()) % 2 == 0)
                     )
             
-            time.sleep(0.5 if active_alarm else 1)  # Schnelleres Update bei Alarm
+            interval = 0.5 if active_alarm else 1  # Schnelleres Update bei Alarm
+            finished = time.perf_counter()
+            observe_loop('update_display', finished - started, started - next_wake if next_wake else None)
+            next_wake = finished + interval
+            profiler.end(profile)  # Ohne das Schlafen
+            time.sleep(interval)
         except Exception as e:
+            profiler.end(profile)
             print(f"Error in display update loop: {e}")
+            next_wake = None
             time.sleep(5)
 
 
-# Start background threads
-if display or hardware:
-    alarm_check_thread = threading.Thread(target=check_alarms_loop, daemon=True)
-    alarm_check_thread.start()
-    
-    if display:
-        display_update_thread = threading.Thread(target=update_display_loop, daemon=True)
-        display_update_thread.start()
-
-
 # Cleanup function
 def cleanup():
     """Cleanup on exit"""
     global running
     running = False
+    alarm_scheduler.notify()
     if hardware:
         hardware.cleanup()
     if display:
         display.cleanup()
+    sound_manager.pipeline.shutdown()
+    alarm_events.shutdown()
+    close_all_connections()
+
 
+@contextmanager
+def startup_phase(name):
+    """Time one phase of the startup (startup_timings)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = time.perf_counter() - started
 
-atexit.register(cleanup)
+
+def create_app():
+    """Initialize database, managers and hardware once; returns the Flask app
+
+    No threads are started here (see start_background_workers), so tests
+    and benchmarks can use the app with the test client.
+    """
+    global user_manager, session_manager, settings_manager, alarm_manager, sound_manager
+    global alarm_scheduler, alarm_events, display, hardware
+    if alarm_manager is not None:
+        return app
+    
+    with startup_phase('database'):
+        # Schema nur einmal prüfen, die Manager-Aufrufe sind danach No-ops
+        init_database()
+    with startup_phase('managers'):
+        user_manager = UserManager()
+        session_manager = SessionManager()
+        settings_manager = SettingsManager()
+        alarm_manager = DBAlarmManager()
+        sound_manager = SoundManager()
+        alarm_scheduler = AlarmScheduler(alarm_manager)
+        alarm_events = AlarmEventLog()
+    with startup_phase('display'):
+        display = init_display()
+    with startup_phase('hardware'):
+        hardware = init_hardware()
+    
+    if not display and not hardware:
+        print("Running in simulation mode (NO hardware detected)")
+    else:
+        print(f"Hardware status: Display={'OK' if display else 'FAIL'}, Hardware={'OK' if hardware else 'FAIL'}")
+    
+    atexit.register(cleanup)
+    return app
+
+
+def warm_up_audio():
+    """Import pygame, open the mixer and render the alarm tone in the background"""
+    with startup_phase('audio_warmup'):
+        ready = hardware.warm_up_audio()
+    print(f"Audio warm-up {'finished' if ready else 'skipped (no pygame mixer)'} "
+          f"after {startup_timings['audio_warmup'] * 1000:.0f} ms")
+
+
+def start_background_workers():
+    """Start the alarm/display threads, event writer, audio warm-up and pending sound processing
+
+    Calls create_app() if needed and starts the workers only once per process.
+    """
+    global alarm_check_thread, display_update_thread, workers_started
+    create_app()
+    if workers_started:
+        return
+    workers_started = True
+    with startup_phase('workers'):
+        alarm_events.start()
+        sound_manager.pipeline.resume_pending()
+        
+        if hardware:
+            threading.Thread(target=warm_up_audio, name='audio-warmup', daemon=True).start()
+        
+        if display or hardware:
+            alarm_check_thread = threading.Thread(target=check_alarms_loop, daemon=True)
+            alarm_check_thread.start()
+            
+            if display:
+                display_update_thread = threading.Thread(target=update_display_loop, daemon=True)
+                display_update_thread.start()
+
+
+def print_startup_report():
+    """Print the duration of each startup phase"""
+    phases = ', '.join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in startup_timings.items())
+    print(f"Startup: {phases} (ready after {(time.perf_counter() - IMPORT_STARTED) * 1000:.0f} ms)")
 
 
 # Authentication and Authorization Decorators
@@ -242,6 +477,33 @@ def role_required(*allowed_roles):
     return decorator
 
 
+def is_local_request():
+    """Request from the Pi itself (not forwarded by a tunnel or proxy running on localhost)"""
+    return request.remote_addr in LOCAL_ADDRESSES and not any(h in request.headers for h in PROXY_HEADERS)
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    if profiler.enabled:
+        g.profile = profiler.begin_request(request.url_rule.rule if request.url_rule else None, request.method)
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Count and time every request per route pattern (not per URL)"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+
+@app.teardown_request
+def finish_request_profile(exc):
+    profiler.end(g.pop('profile', None))
+
+
 # Web Interface Routes
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -356,18 +618,102 @@ def api_me():
 
 
 # API Routes - Alarms
+ALARM_QUERY_PARAMS = ('limit', 'cursor', 'user_id', 'enabled', 'weekday', 'time_from', 'time_to', 'label')
+ALARM_PAGE_SIZE = 50
+ALARM_PAGE_MAX = 200
+TIME_PATTERN = re.compile(r'^\d{2}:\d{2}$')
+
+
+def valid_alarm_time(value):
+    """True for an "HH:MM" string with hour 00-23 and minute 00-59"""
+    return isinstance(value, str) and bool(TIME_PATTERN.match(value)) \
+        and int(value[:2]) < 24 and int(value[3:]) < 60
+
+
+def valid_alarm_days(value):
+    """True for None or a list of weekdays 0-6 (0 = Monday)"""
+    return value is None or isinstance(value, list) and all(
+        isinstance(day, int) and not isinstance(day, bool) and 0 <= day <= 6 for day in value)
+
+
+def int_param(args, key, message):
+    """Read an integer query parameter; raises ValueError(message) if it is not one"""
+    try:
+        return int(args[key])
+    except ValueError:
+        raise ValueError(message) from None
+
+
+def parse_alarm_query(args, user):
+    """Parse filter and keyset pagination parameters of GET /api/alarms
+
+    Raises ValueError with a fixed message per parameter for invalid values.
+    """
+    limit = ALARM_PAGE_SIZE
+    if args.get('limit'):
+        limit = int_param(args, 'limit', 'limit must be a positive integer')
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    query = {'limit': min(limit, ALARM_PAGE_MAX)}
+    
+    # Benutzer sehen nur eigene Alarme, Admins können filtern
+    if user['role'] != 'admin':
+        query['user_id'] = user['id']
+    elif args.get('user_id'):
+        query['user_id'] = int_param(args, 'user_id', 'user_id must be an integer')
+    
+    if args.get('enabled'):
+        query['enabled'] = args['enabled'].lower() in ('1', 'true', 'yes')
+    if args.get('weekday'):
+        query['weekday'] = int_param(args, 'weekday', 'weekday must be 0 (Monday) to 6 (Sunday)')
+        if not 0 <= query['weekday'] <= 6:
+            raise ValueError('weekday must be 0 (Monday) to 6 (Sunday)')
+    for key in ('time_from', 'time_to'):
+        if args.get(key):
+            if not TIME_PATTERN.match(args[key]):
+                raise ValueError(f'{key} must be HH:MM')
+            query[key] = args[key]
+    if args.get('label'):
+        query['label_prefix'] = args['label']
+    if args.get('cursor'):
+        # Cursor = "HH:MM,id" des letzten Alarms der vorherigen Seite
+        time_str, _, alarm_id = args['cursor'].rpartition(',')
+        if not TIME_PATTERN.match(time_str) or not alarm_id.isdigit():
+            raise ValueError('Invalid cursor')
+        query['after'] = (time_str, int(alarm_id))
+    return query
+
+
 @app.route('/api/alarms', methods=['GET'])
 @login_required
 def get_alarms():
-    """Get all alarms (user sees own, admin sees all)"""
+    """Get alarms (user sees own, admin sees all); filters and ?limit/?cursor page through them"""
     user = request.current_user
+    paged = any(key in request.args for key in ALARM_QUERY_PARAMS)
+    
+    etag = data_etag(f"alarms-{zlib.crc32(request.query_string):08x}" if paged else 'alarms')
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    if paged:
+        try:
+            query = parse_alarm_query(request.args, user)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        alarms, next_after = alarm_manager.query_alarms(**query)
+        return conditional_json(etag, {
+            'alarms': [a.to_dict() for a in alarms],
+            'next_cursor': f"{next_after[0]},{next_after[1]}" if next_after else None,
+            'active_alarm': active_alarm.to_dict() if active_alarm else None
+        })
     
     if user['role'] == 'admin':
         alarms = alarm_manager.get_all_alarms()
     else:
         alarms = alarm_manager.get_user_alarms(user['id'])
     
-    return jsonify({
+    return conditional_json(etag, {
         'alarms': [a.to_dict() for a in alarms],
         'active_alarm': active_alarm.to_dict() if active_alarm else None
     })
@@ -396,6 +742,8 @@ def create_alarm():
     
     if not time_str:
         return jsonify({'error': 'Time is required'}), 400
+    if not valid_alarm_time(time_str):
+        return jsonify({'error': 'Time must be HH:MM (00:00-23:59)'}), 400
     
     # Validierung: days muss Liste sein oder None
     if days is not None and not isinstance(days, list):
@@ -418,6 +766,7 @@ def create_alarm():
             print("Error: add_alarm returned None")
             return jsonify({'error': 'Failed to create alarm - returned None'}), 500
         
+        notify_alarm_change('alarm_created', alarm.id, alarm.user_id, alarm.to_dict())
         return jsonify(alarm.to_dict()), 201
     except ValueError as e:
         print(f"ValueError creating alarm: {e}")
@@ -452,6 +801,9 @@ def update_alarm(alarm_id):
     if user['role'] != 'admin' and alarm.user_id != user['id']:
         return jsonify({'error': 'Permission denied'}), 403
     
+    if data.get('time') is not None and not valid_alarm_time(data['time']):
+        return jsonify({'error': 'Time must be HH:MM (00:00-23:59)'}), 400
+    
     # Validierung: days muss Liste sein oder None
     days = data.get('days')
     if days is not None and not isinstance(days, list):
@@ -472,6 +824,7 @@ def update_alarm(alarm_id):
         if not alarm:
             return jsonify({'error': 'Failed to update alarm'}), 500
         
+        notify_alarm_change('alarm_updated', alarm.id, alarm.user_id, alarm.to_dict())
         return jsonify(alarm.to_dict())
     except Exception as e:
         print(f"Error updating alarm: {e}")
@@ -493,10 +846,125 @@ def delete_alarm(alarm_id):
         return jsonify({'error': 'Permission denied'}), 403
     
     if alarm_manager.delete_alarm(alarm_id):
+        notify_alarm_change('alarm_deleted', alarm_id, alarm.user_id)
         return jsonify({'success': True}), 200
     return jsonify({'error': 'Failed to delete alarm'}), 500
 
 
+ALARM_BATCH_MAX_ITEMS = 1000
+ALARM_FIELDS = ('time', 'days', 'enabled', 'label', 'sound_file', 'snooze_allowed', 'snooze_duration')
+
+
+@app.route('/api/alarms/batch', methods=['POST'])
+@login_required
+def batch_alarms():
+    """Create, update and delete many alarms in one transaction (all or nothing)"""
+    if not request.is_json:
+        return jsonify({'error': 'Content-Type must be application/json'}), 400
+    
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid JSON data'}), 400
+    
+    user = request.current_user
+    create_items = data.get('create') or []
+    update_items = data.get('update') or []
+    delete_items = data.get('delete') or []
+    if not all(isinstance(items, list) for items in (create_items, update_items, delete_items)):
+        return jsonify({'error': 'create, update and delete must be lists'}), 400
+    if len(create_items) + len(update_items) + len(delete_items) > ALARM_BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Too many items. Maximum: {ALARM_BATCH_MAX_ITEMS}'}), 400
+    
+    # Alles vorab prüfen, damit Fehler pro Eintrag gemeldet werden können
+    errors = []
+    creates, updates, deletes = [], [], []
+    seen_ids = set()
+    
+    def check_owner(op, index, alarm_id):
+        alarm = alarm_manager.get_alarm(alarm_id) if isinstance(alarm_id, int) else None
+        if not alarm:
+            errors.append({'op': op, 'index': index, 'id': alarm_id, 'error': 'Alarm not found', 'status': 404})
+        elif user['role'] != 'admin' and alarm.user_id != user['id']:
+            errors.append({'op': op, 'index': index, 'id': alarm_id, 'error': 'Permission denied', 'status': 403})
+        elif alarm_id in seen_ids:
+            errors.append({'op': op, 'index': index, 'id': alarm_id, 'error': 'Alarm listed more than once', 'status': 400})
+        else:
+            seen_ids.add(alarm_id)
+            return alarm
+        return None
+    
+    for index, item in enumerate(create_items):
+        if not isinstance(item, dict) or not item.get('time'):
+            errors.append({'op': 'create', 'index': index, 'error': 'Time is required', 'status': 400})
+            continue
+        if not valid_alarm_time(item['time']):
+            errors.append({'op': 'create', 'index': index, 'error': 'Time must be HH:MM (00:00-23:59)',
+                           'status': 400})
+            continue
+        if not valid_alarm_days(item.get('days')):
+            errors.append({'op': 'create', 'index': index, 'error': 'Days must be a list of weekdays 0-6',
+                           'status': 400})
+            continue
+        fields = {key: item[key] for key in ALARM_FIELDS if key in item}
+        creates.append(dict(fields, user_id=user['id']))
+    
+    for index, item in enumerate(update_items):
+        if not isinstance(item, dict):
+            errors.append({'op': 'update', 'index': index, 'error': 'Invalid item', 'status': 400})
+            continue
+        if item.get('time') is not None and not valid_alarm_time(item['time']):
+            errors.append({'op': 'update', 'index': index, 'id': item.get('id'),
+                           'error': 'Time must be HH:MM (00:00-23:59)', 'status': 400})
+            continue
+        if not valid_alarm_days(item.get('days')):
+            errors.append({'op': 'update', 'index': index, 'id': item.get('id'),
+                           'error': 'Days must be a list of weekdays 0-6', 'status': 400})
+            continue
+        if check_owner('update', index, item.get('id')):
+            updates.append((item['id'], {key: item.get(key) for key in ALARM_FIELDS}))
+    
+    for index, alarm_id in enumerate(delete_items):
+        if check_owner('delete', index, alarm_id):
+            deletes.append(alarm_id)
+    
+    if errors:
+        return jsonify({'error': 'Batch rejected, nothing was applied', 'errors': errors}), 400
+    
+    deleted_owners = {}
+    for alarm_id in deletes:
+        alarm = alarm_manager.get_alarm(alarm_id)
+        if alarm is None:
+            # Seit der Prüfung von einer anderen Anfrage gelöscht
+            return jsonify({'error': f'Batch rejected, nothing was applied: Alarm {alarm_id} not found'}), 409
+        deleted_owners[alarm_id] = alarm.user_id
+    
+    try:
+        created, updated, deleted = alarm_manager.apply_batch(creates, updates, deletes)
+    except KeyError as e:
+        # Zwischenzeitlich von einer anderen Anfrage gelöscht
+        return jsonify({'error': f'Batch rejected, nothing was applied: {e.args[0]}'}), 409
+    except Exception as e:
+        print(f"Error applying alarm batch: {e}")
+        return jsonify({'error': 'Failed to apply batch, nothing was applied'}), 500
+    
+    # Ein Ereignis pro betroffenem Benutzer statt eines pro Alarm
+    alarm_scheduler.notify()
+    changes = {}
+    for key, alarms in (('created', created), ('updated', updated)):
+        for alarm in alarms:
+            changes.setdefault(alarm.user_id, {'created': [], 'updated': [], 'deleted': []})[key].append(alarm.id)
+    for alarm_id in deleted:
+        changes.setdefault(deleted_owners[alarm_id], {'created': [], 'updated': [], 'deleted': []})['deleted'].append(alarm_id)
+    for owner, change in changes.items():
+        event_bus.publish('alarms_batch', change, user_id=owner)
+    
+    return jsonify({
+        'created': [a.to_dict() for a in created],
+        'updated': [a.to_dict() for a in updated],
+        'deleted': deleted
+    })
+
+
 @app.route('/api/alarms/<int:alarm_id>/snooze', methods=['POST'])
 @login_required
 def snooze_alarm(alarm_id):
@@ -517,10 +985,13 @@ def snooze_alarm(alarm_id):
     
     if alarm_manager.snooze_alarm(alarm_id, minutes):
         global active_alarm
+        alarm_events.stopped(alarm, EVENT_SNOOZED, SOURCE_API)
+        notify_alarm_change('alarm_snoozed', alarm_id, alarm.user_id)
         if active_alarm and active_alarm.id == alarm_id:
             if hardware:
                 hardware.stop_sound()
             active_alarm = None
+            publish_active_alarm('snoozed')
         return jsonify({'success': True}), 200
     return jsonify({'error': 'Failed to snooze alarm'}), 500
 
@@ -531,15 +1002,112 @@ def dismiss_alarm(alarm_id):
     """Dismiss an alarm"""
     if alarm_manager.dismiss_alarm(alarm_id):
         global active_alarm
+        alarm = alarm_manager.get_alarm(alarm_id)
+        if alarm:
+            alarm_events.stopped(alarm, EVENT_DISMISSED, SOURCE_API)
+        notify_alarm_change('alarm_dismissed', alarm_id, alarm.user_id if alarm else None)
         if active_alarm and active_alarm.id == alarm_id:
             if hardware:
                 hardware.stop_sound()
             active_alarm = None
+            publish_active_alarm('dismissed')
         return jsonify({'success': True}), 200
     return jsonify({'error': 'Alarm not found'}), 404
 
 
+def event_scope(args, user):
+    """User id whose alarm events may be read (None = all, admins only)"""
+    if user['role'] != 'admin':
+        return user['id']
+    return int(args['user_id']) if args.get('user_id') else None
+
+
+# Obergrenze für ?days= der Latenz-Auswertung (10 Jahre)
+MAX_LATENCY_DAYS = 3650
+
+
+@app.route('/api/alarms/latency', methods=['GET'])
+@login_required
+def get_alarm_latency():
+    """Trigger latency percentiles (ms after the due time) over the last ?days (default 7)"""
+    try:
+        user_id = event_scope(request.args, request.current_user)
+        days = float(request.args.get('days', 7))
+    except ValueError:
+        return jsonify({'error': 'Invalid query parameter'}), 400
+    
+    # Auch inf/nan abfangen, timedelta würde sonst OverflowError werfen
+    if not 0 < days <= MAX_LATENCY_DAYS:
+        return jsonify({'error': f'days must be between 0 and {MAX_LATENCY_DAYS}'}), 400
+    
+    stats = alarm_events.latency_stats(datetime.now() - timedelta(days=days), user_id)
+    stats['dropped_events'] = alarm_events.dropped
+    return jsonify(stats)
+
+
+@app.route('/api/alarms/events', methods=['GET'])
+@login_required
+def get_alarm_events():
+    """Newest alarm events (firings with timestamps, snoozes and dismissals)"""
+    try:
+        user_id = event_scope(request.args, request.current_user)
+        limit = min(int(request.args.get('limit', ALARM_PAGE_SIZE)), ALARM_PAGE_MAX)
+    except ValueError:
+        return jsonify({'error': 'Invalid query parameter'}), 400
+    
+    return jsonify({'events': alarm_events.recent(user_id, max(limit, 1))})
+
+
+@app.route('/api/events', methods=['GET'])
+@login_required
+def stream_events():
+    """Server-Sent Events stream with alarm, active alarm and status changes"""
+    user = request.current_user
+    session_id = user['session_id']
+    subscription = event_bus.subscribe(max_subscribers=SSE_MAX_CONNECTIONS)
+    if subscription is None:
+        # Jeder Stream hält einen Server-Thread; der Client fällt auf Polling zurück
+        response = jsonify({'error': 'Too many event streams, use polling'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(SSE_HEARTBEAT_SECONDS)
+        return response
+    
+    def generate():
+        try:
+            yield 'retry: 5000\n\n'
+            yield format_sse('status', status_snapshot(), event_bus.version)
+            while running:
+                try:
+                    message = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    message = None
+                # Stream beenden, sobald die Session abgelaufen ist oder abgemeldet wurde
+                if not session_manager.get_session(session_id):
+                    break
+                if message is None:
+                    yield ': keepalive\n\n'
+                    continue
+                
+                owner = message['user_id']
+                if owner is not None and user['role'] != 'admin' and owner != user['id']:
+                    continue
+                yield format_sse(message['event'], message['data'], message['id'])
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Kein Buffering hinter nginx
+    })
+
+
 # API Routes - Sounds
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    """Reject oversized uploads with a JSON error"""
+    return jsonify({'error': f'File too large. Maximum size: {MAX_SOUND_UPLOAD_BYTES // (1024 * 1024)}MB'}), 413
+
+
 @app.route('/api/sounds', methods=['GET'])
 @login_required
 def get_sounds():
@@ -565,14 +1133,7 @@ def upload_sound():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
-    # Check file size (max 10MB)
-    file.seek(0, os.SEEK_END)
-    file_size = file.tell()
-    file.seek(0)
-    
-    if file_size > 10 * 1024 * 1024:  # 10MB
-        return jsonify({'error': 'File too large. Maximum size: 10MB'}), 400
-    
+    # Größe wurde schon beim Streamen geprüft (HashingUpload, MAX_CONTENT_LENGTH)
     # Check file extension
     allowed_extensions = {'wav', 'mp3', 'ogg', 'flac'}
     if '.' not in file.filename or file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
@@ -601,16 +1162,84 @@ def delete_sound(sound_id):
         if not any(s['id'] == sound_id for s in sounds):
             return jsonify({'error': 'Permission denied'}), 403
     
+    sound_info = sound_manager.get_sound(sound_id)
     if sound_manager.delete_sound(sound_id, user['id'] if user['role'] != 'admin' else None):
+        if hardware and sound_info:
+            hardware.sound_cache.discard(sound_info['filepath'])
+            hardware.sound_cache.discard(sound_info['playback_filepath'])
         return jsonify({'success': True}), 200
     return jsonify({'error': 'Sound not found'}), 404
 
 
+@app.route('/api/sounds/<int:sound_id>/peaks', methods=['GET'])
+@login_required
+def get_sound_peaks(sound_id):
+    """Get duration, format and waveform peaks of a sound (?format=binary for raw int8 pairs)"""
+    user = request.current_user
+    info = sound_manager.get_peaks(sound_id)
+    if not info or (user['role'] != 'admin' and info['user_id'] != user['id']):
+        return jsonify({'error': 'Sound not found'}), 404
+    if info['peaks'] is None:
+        # Noch in der Hintergrundverarbeitung (oder fehlgeschlagen)
+        return jsonify({'id': sound_id, 'processing_status': info['processing_status']}), 202
+    
+    binary = request.args.get('format') == 'binary'
+    etag = f"peaks-{sound_id}-{info['content_hash'] or ''}-{'bin' if binary else 'json'}"
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    if binary:
+        # Verschachtelte Min/Max-Paare als int8
+        response = Response(info['peaks'], mimetype='application/octet-stream')
+        response.headers['X-Duration-Ms'] = str(info['duration_ms'])
+        response.headers['X-Sample-Rate'] = str(info['sample_rate'])
+        response.headers['X-Channels'] = str(info['channels'])
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    return conditional_json(etag, {
+        'id': sound_id,
+        'duration_ms': info['duration_ms'],
+        'sample_rate': info['sample_rate'],
+        'channels': info['channels'],
+        'peaks': list(memoryview(info['peaks']).cast('b'))
+    })
+
+
+SOUND_ORIGINAL_NAME = re.compile(r'^([0-9a-f]{64})\.\w+$')            # <sha256>.<ext>
+SOUND_RENDITION_NAME = re.compile(r'^([0-9a-f]{64})\.(norm|preview)\.wav$')
+SOUND_CACHE_SECONDS = 365 * 24 * 3600
+
+
 @app.route('/sounds/<filename>')
 @login_required
 def serve_sound(filename):
-    """Serve sound files"""
-    return send_from_directory(SOUNDS_DIR, filename)
+    """Serve sound files (byte ranges, strong ETags, ?preview=1 for a low-bitrate preview)"""
+    if request.args.get('preview'):
+        filename = sound_manager.get_preview(filename) or filename
+    
+    # Inhaltsadressierte Originale ändern sich nie: Hash als ETag, unbegrenzt cachen
+    original = SOUND_ORIGINAL_NAME.match(filename)
+    rendition = SOUND_RENDITION_NAME.match(filename)
+    if original:
+        etag = original.group(1)
+    elif rendition:
+        etag = f"{rendition.group(1)}-{rendition.group(2)}"
+    else:
+        etag = True
+    
+    response = send_from_directory(SOUNDS_DIR, filename, etag=etag, conditional=True)
+    response.cache_control.private = True
+    if original:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = SOUND_CACHE_SECONDS
+        response.cache_control.immutable = True
+    else:
+        # Abgeleitete/alte Dateien: nur per ETag revalidieren
+        response.cache_control.no_cache = True
+    return response
 
 
 # API Routes - Users (Admin only)
@@ -647,6 +1276,97 @@ def create_user():
         return jsonify({'error': str(e)}), 400
 
 
+# API Routes - Metrics
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics (admin session or local scraper without proxy headers)"""
+    if not is_local_request():
+        session_id = session.get('session_id')
+        user = session_manager.get_session(session_id) if session_id else None
+        if not user:
+            return jsonify({'error': 'Authentication required'}), 401
+        if user.get('role') != 'admin':
+            return jsonify({'error': 'Insufficient permissions'}), 403
+    
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# API Routes - Profiler (Admin only)
+@app.route('/api/profiler', methods=['GET'])
+@role_required('admin')
+def get_profiler():
+    """Profiling session state and collected targets"""
+    return jsonify(profiler.status())
+
+
+@app.route('/api/profiler', methods=['POST'])
+@role_required('admin')
+def start_profiler():
+    """Start a profiling session (discards earlier results)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        sample_rate = float(data.get('sample_rate', 0))
+        loop_iterations = int(data.get('loop_iterations', 0))
+        max_requests = int(data['max_requests']) if data.get('max_requests') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid profiler settings'}), 400
+    
+    route = data.get('route') or None
+    if not 0 <= sample_rate <= 1:
+        return jsonify({'error': 'sample_rate must be between 0 and 1'}), 400
+    if loop_iterations < 0 or (max_requests is not None and max_requests < 0):
+        return jsonify({'error': 'loop_iterations and max_requests must not be negative'}), 400
+    if route and route not in {rule.rule for rule in app.url_map.iter_rules()}:
+        return jsonify({'error': f'Unknown route: {route}'}), 400
+    if not (sample_rate or route or loop_iterations):
+        return jsonify({'error': 'Nothing to profile: set sample_rate, route or loop_iterations'}), 400
+    
+    profiler.start(sample_rate, route, loop_iterations, max_requests)
+    return jsonify(profiler.status()), 201
+
+
+@app.route('/api/profiler', methods=['DELETE'])
+@role_required('admin')
+def stop_profiler():
+    """Stop profiling; results stay downloadable"""
+    profiler.stop()
+    return jsonify(profiler.status())
+
+
+@app.route('/api/profiler/results', methods=['GET'])
+@role_required('admin')
+def get_profiler_results():
+    """Collected results: ?format=text (default), pstats or folded; optional ?target="""
+    target = request.args.get('target') or None
+    output_format = request.args.get('format', 'text')
+    
+    if output_format == 'pstats':
+        data = profiler.pstats_dump(target)
+        mimetype, filename = 'application/octet-stream', 'wecker.pstats'
+    elif output_format == 'folded':
+        data = profiler.folded(target)
+        mimetype, filename = 'text/plain', 'wecker.folded'
+    elif output_format == 'text':
+        sort = request.args.get('sort', 'cumulative')
+        if sort not in PSTATS_SORT_KEYS:
+            return jsonify({'error': f"sort must be one of {', '.join(PSTATS_SORT_KEYS)}"}), 400
+        try:
+            limit = int(request.args.get('limit', 40))
+        except ValueError:
+            return jsonify({'error': 'Invalid limit'}), 400
+        data = profiler.text_report(target, sort, limit)
+        mimetype, filename = 'text/plain', None
+    else:
+        return jsonify({'error': 'format must be text, pstats or folded'}), 400
+    
+    if data is None:
+        return jsonify({'error': 'No profiling data'}), 404
+    response = Response(data, mimetype=mimetype)
+    if filename:
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
 # API Routes - Status
 @app.route('/api/status', methods=['GET'])
 @login_required
@@ -656,15 +1376,27 @@ def get_status():
     user = request.current_user
     
     try:
+        # Nächster Alarm ist gemerkt, bis sich Alarme ändern oder sein Fenster abläuft:
+        # ein 304 kostet damit keine Abfrage und schreibt nichts
+        next_alarm = alarm_manager.next_alarm(None if user['role'] == 'admin' else user['id'], current_time)
+        next_fire = next_alarm.next_fire_at.isoformat() if next_alarm else 'none'
+        
+        # current_time ändert sich immer, zählt aber nicht zur Datenversion
+        etag = f"{data_etag('status')}-{next_fire}"
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        
         if user['role'] == 'admin':
             alarm_count = len(alarm_manager.get_all_alarms())
         else:
             alarm_count = len(alarm_manager.get_user_alarms(user['id']))
         
-        return jsonify({
+        return conditional_json(etag, {
             'current_time': current_time.isoformat(),
             'alarm_count': alarm_count,
             'active_alarm': active_alarm.to_dict() if active_alarm else None,
+            'next_alarm': next_alarm.to_dict() if next_alarm else None,
             'hardware_available': display is not None and hardware is not None,
             'user': user
         })
@@ -757,11 +1489,11 @@ def test_sound():
 def test_button():
     """Test the button - returns current button state"""
     try:
-        if not hardware:
+        if not hardware or hardware.simulation_mode:
             return jsonify({'error': 'Hardware nicht verfügbar'}), 400
         
-        import RPi.GPIO as GPIO
         from config import BUTTON_PIN
+        GPIO = hardware.gpio
         
         # Lese Button-Status
         button_state = GPIO.input(BUTTON_PIN)
@@ -780,7 +1512,13 @@ def test_button():
         return jsonify({'error': f'Button-Test fehlgeschlagen: {str(e)}'}), 500
 
 
+startup_timings['imports'] = time.perf_counter() - IMPORT_STARTED
+
+
 if __name__ == '__main__':
+    create_app()
+    start_background_workers()
+    print_startup_report()
     print(f"Starting Wecker server on {WEB_HOST}:{WEB_PORT}")
     print("=" * 60)
     print("Web interface:")
@@ -0,0 +1,298 @@
+"""
+Background processing of uploaded sounds
+
+Each upload is decoded once in a worker thread, converted to the mixer's
+sample rate and channel layout, trimmed of leading silence and loudness
+normalized with NumPy. The playback-ready WAV rendition is stored next to
+the original and the job status is tracked in the sounds table.
+"""
+import os
+import struct
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from config import AUDIO_WORKERS
+from database import get_db
+from sound_cache import init_mixer
+
+PROCESSED_SUFFIX = '.norm.wav'
+PREVIEW_SUFFIX = '.preview.wav'
+PREVIEW_SAMPLE_RATE = 8000  # 8 kHz mono 8-bit: ca. 8 KB pro Sekunde
+PREVIEW_SECONDS = 15
+PEAK_BUCKETS = 400  # Min/Max-Paare pro Wellenform (800 Bytes)
+TARGET_RMS = 0.125        # ca. -18 dBFS
+PEAK_LIMIT = 0.98         # Verstärkung so begrenzen, dass nichts clippt
+SILENCE_THRESHOLD = 0.01  # Amplitude, ab der ein Sample nicht mehr als Stille gilt
+HEADER_BYTES = 64 * 1024  # So viel wird zum Lesen des Originalformats gelesen
+# MPEG-Version (Bits im Frame-Header) -> Abtastraten; 1 ist reserviert
+MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+# Status values of sounds.processing_status
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+
+def decode_sound(path):
+    """Decode a file to float32 samples of shape (frames, channels) in mixer format
+
+    pygame converts to the mixer's sample rate and channel layout while
+    decoding. Returns (samples, sample_rate).
+    """
+    import numpy as np
+    import pygame
+
+    if not init_mixer():
+        raise RuntimeError("pygame not available")
+    frequency, size, _ = pygame.mixer.get_init()
+
+    samples = pygame.sndarray.array(pygame.mixer.Sound(path))
+    if samples.ndim == 1:
+        samples = samples.reshape(-1, 1)
+
+    if samples.dtype.kind == 'f':
+        samples = samples.astype(np.float32)
+    else:
+        info = np.iinfo(samples.dtype)
+        offset = (int(info.max) + int(info.min) + 1) / 2
+        scale = (int(info.max) - int(info.min) + 1) / 2
+        samples = (samples.astype(np.float32) - np.float32(offset)) / np.float32(scale)
+    return samples, frequency
+
+
+def trim_leading_silence(samples, threshold=SILENCE_THRESHOLD):
+    """Drop frames before the first one louder than threshold"""
+    import numpy as np
+    loud = np.flatnonzero(np.abs(samples).max(axis=1) > threshold)
+    if len(loud) == 0:
+        return samples
+    return samples[loud[0]:]
+
+
+def normalize_loudness(samples, target_rms=TARGET_RMS, peak_limit=PEAK_LIMIT):
+    """Scale samples to the target RMS without exceeding the peak limit"""
+    import numpy as np
+    if samples.size == 0:
+        return samples
+    rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+    peak = float(np.abs(samples).max())
+    if rms == 0 or peak == 0:
+        return samples
+    gain = min(target_rms / rms, peak_limit / peak)
+    return samples * np.float32(gain)
+
+
+def write_wav(path, samples, sample_rate):
+    """Write float samples as 16-bit PCM WAV"""
+    import numpy as np
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+
+
+def compute_peaks(samples, buckets=PEAK_BUCKETS):
+    """Downsample samples to interleaved min/max int8 pairs (bytes)"""
+    import numpy as np
+    frames = len(samples)
+    if frames == 0:
+        return b''
+    buckets = min(buckets, frames)
+
+    # Über alle Kanäle zusammengefasst, dann pro Bucket reduziert
+    low = samples.min(axis=1)
+    high = samples.max(axis=1)
+    starts = np.arange(buckets) * frames // buckets
+    peaks = np.empty((buckets, 2), dtype=np.float32)
+    peaks[:, 0] = np.minimum.reduceat(low, starts)
+    peaks[:, 1] = np.maximum.reduceat(high, starts)
+    return np.round(np.clip(peaks, -1.0, 1.0) * 127).astype(np.int8).tobytes()
+
+
+def _wav_format(head):
+    offset = 12
+    while offset + 8 <= len(head):
+        chunk_id, size = struct.unpack_from('<4sI', head, offset)
+        if chunk_id == b'fmt ':
+            channels, rate = struct.unpack_from('<HI', head, offset + 10)
+            return rate, channels
+        offset += 8 + size + (size & 1)
+    return None, None
+
+
+def _flac_format(head):
+    # STREAMINFO ist immer der erste Metadatenblock: 20 Bit Rate, 3 Bit Kanäle - 1
+    bits = int.from_bytes(head[18:22], 'big')
+    return bits >> 12, ((bits >> 9) & 0x7) + 1
+
+
+def _ogg_format(head):
+    packet = head[27 + head[26]:]
+    if packet[:7] == b'\x01vorbis':
+        return struct.unpack_from('<I', packet, 12)[0], packet[11]
+    if packet[:8] == b'OpusHead':
+        rate = struct.unpack_from('<I', packet, 12)[0]
+        return rate or 48000, packet[9]
+    return None, None
+
+
+def _mp3_format(head):
+    # Erster gültiger Frame-Header (Sync-Bits, Layer, Bitrate, Abtastrate, Emphasis)
+    for i in range(len(head) - 3):
+        b1, b2, b3 = head[i + 1], head[i + 2], head[i + 3]
+        if head[i] != 0xFF or b1 & 0xE0 != 0xE0:
+            continue
+        version, layer, rate_index = (b1 >> 3) & 3, (b1 >> 1) & 3, (b2 >> 2) & 3
+        if version == 1 or layer == 0 or b2 >> 4 in (0, 15) or rate_index == 3 or b3 & 3 == 2:
+            continue
+        return MP3_SAMPLE_RATES[version][rate_index], 1 if b3 >> 6 == 3 else 2
+    return None, None
+
+
+def source_format(path):
+    """Read (sample_rate, channels) of the original file from its header
+
+    decode_sound already converts to the mixer format, so the original
+    format has to come from the file itself (WAV, FLAC, Ogg Vorbis/Opus,
+    MP3). Returns (None, None) for unknown or damaged headers.
+    """
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(HEADER_BYTES)
+            if head[:3] == b'ID3':
+                # ID3-Tag (evtl. mit Cover) überspringen, Synchsafe-Größe
+                size = 0
+                for byte in head[6:10]:
+                    size = (size << 7) | (byte & 0x7F)
+                f.seek(10 + size + (10 if head[5] & 0x10 else 0))
+                head = f.read(HEADER_BYTES)
+                return _mp3_format(head)
+    except (OSError, IndexError, struct.error):
+        return None, None
+
+    try:
+        if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+            return _wav_format(head)
+        if head[:4] == b'fLaC':
+            return _flac_format(head)
+        if head[:4] == b'OggS':
+            return _ogg_format(head)
+        if head[:1] == b'\xff':
+            # MP3 ohne ID3-Tag beginnt direkt mit einem Frame; sonst kein bekanntes Format
+            return _mp3_format(head[:4])
+        return None, None
+    except (struct.error, IndexError):
+        return None, None
+
+
+def analyze(samples, sample_rate, path):
+    """Get duration, original format and waveform peaks of a decoded file"""
+    source_rate, source_channels = source_format(path)
+    return {
+        'duration_ms': int(round(len(samples) * 1000 / sample_rate)),
+        'sample_rate': source_rate,
+        'channels': source_channels,
+        'peaks': compute_peaks(samples)
+    }
+
+
+def render_preview(source_path, preview_path, seconds=PREVIEW_SECONDS, sample_rate=PREVIEW_SAMPLE_RATE):
+    """Write a short low-bitrate (mono, 8-bit) WAV preview of a sound"""
+    import numpy as np
+    samples, source_rate = decode_sound(source_path)
+    mono = samples[:int(seconds * source_rate)].mean(axis=1)
+
+    # Einfacher Tiefpass (gleitender Mittelwert) gegen Aliasing beim Heruntertakten
+    width = max(1, int(np.ceil(source_rate / sample_rate)))
+    if width > 1 and len(mono) >= width:
+        mono = np.convolve(mono, np.ones(width, dtype=np.float32) / width, mode='same')
+    frames = int(len(mono) * sample_rate / source_rate)
+    resampled = np.interp(np.arange(frames) * (source_rate / sample_rate), np.arange(len(mono)), mono)
+
+    # 8-bit WAV ist vorzeichenlos mit Nullpunkt 128
+    pcm = (np.clip(resampled, -1.0, 1.0) * 127 + 128).astype(np.uint8)
+    with wave.open(preview_path + '.tmp', 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(1)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    os.replace(preview_path + '.tmp', preview_path)
+
+
+class AudioPipeline:
+    def __init__(self, sounds_dir, workers=AUDIO_WORKERS):
+        self.sounds_dir = sounds_dir
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio')
+
+    def submit(self, sound_id):
+        """Queue a sound for processing; returns immediately"""
+        return self._executor.submit(self._process, sound_id)
+
+    def resume_pending(self):
+        """Queue sounds left unprocessed (e.g. by a restart during processing)"""
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id FROM sounds WHERE processing_status IN (?, ?)
+        ''', (STATUS_PENDING, STATUS_PROCESSING))
+        sound_ids = [row['id'] for row in cursor.fetchall()]
+        conn.close()
+
+        for sound_id in sound_ids:
+            self.submit(sound_id)
+        return len(sound_ids)
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _set_status(self, sound_id, status, processed_filename=None, error=None):
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE sounds SET processing_status = ?, processed_filename = ?, processing_error = ?
+            WHERE id = ?
+        ''', (status, processed_filename, error, sound_id))
+        conn.commit()
+        conn.close()
+
+    def _store_analysis(self, sound_id, analysis):
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE sounds SET duration_ms = ?, sample_rate = ?, channels = ?, peaks = ?
+            WHERE id = ?
+        ''', (analysis['duration_ms'], analysis['sample_rate'], analysis['channels'],
+              analysis['peaks'], sound_id))
+        conn.commit()
+        conn.close()
+
+    def _process(self, sound_id):
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('SELECT filename FROM sounds WHERE id = ?', (sound_id,))
+        row = cursor.fetchone()
+        conn.close()
+        if not row:
+            return None
+
+        self._set_status(sound_id, STATUS_PROCESSING)
+        try:
+            path = os.path.join(self.sounds_dir, row['filename'])
+            samples, sample_rate = decode_sound(path)
+            self._store_analysis(sound_id, analyze(samples, sample_rate, path))
+            samples = normalize_loudness(trim_leading_silence(samples))
+
+            processed_filename = row['filename'].rsplit('.', 1)[0] + PROCESSED_SUFFIX
+            processed_path = os.path.join(self.sounds_dir, processed_filename)
+            # Erst vollständig schreiben, dann atomar umbenennen
+            write_wav(processed_path + '.tmp', samples, sample_rate)
+            os.replace(processed_path + '.tmp', processed_path)
+
+            self._set_status(sound_id, STATUS_READY, processed_filename)
+            return processed_filename
+        except Exception as e:
+            print(f"Error processing sound {sound_id}: {e}")
+            self._set_status(sound_id, STATUS_FAILED, error=str(e))
+            return None
@@ -0,0 +1,98 @@
+"""
+Check that the hot queries use their indexes on a realistically sized database
+
+Fills a scratch database (temporary directory) with thousands of users,
+alarms, sessions, sounds and alarm events, then runs EXPLAIN QUERY PLAN
+for every query of migrations.hot_queries() - once without table statistics
+(like the app, which never runs ANALYZE) and once after ANALYZE. Exits
+with 1 if any plan does not use its expected index.
+
+Usage: python benchmarks/check_query_plans.py [--alarms 5000] [--sessions 5000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def populate(conn, alarms, sessions, seed=7):
+    """Insert users, alarms, sessions, sounds and alarm events"""
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    users = max(alarms // 25, 10)
+
+    conn.executemany('INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)',
+                     [(f'plan{i}', 'x', 'user') for i in range(users)])
+    user_ids = [row[0] for row in conn.execute('SELECT id FROM users')]
+
+    conn.executemany('''
+        INSERT INTO alarms (user_id, time, days, enabled, label, next_fire_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [(rng.choice(user_ids), f"{rng.randrange(24):02d}:{rng.randrange(60):02d}", None,
+           rng.random() < 0.9, f'Alarm {i}',
+           (now + timedelta(minutes=rng.randrange(7 * 24 * 60))).isoformat())
+          for i in range(alarms)])
+    conn.executemany('INSERT INTO sessions (session_id, user_id, expires_at) VALUES (?, ?, ?)',
+                     [(f'session{i}', rng.choice(user_ids), now + timedelta(hours=rng.randint(-48, 24)))
+                      for i in range(sessions)])
+    conn.executemany('''
+        INSERT INTO sounds (filename, original_filename, user_id, processing_status, uploaded_at)
+        VALUES (?, ?, ?, 'ready', ?)
+    ''', [(f'{i:064x}.wav', f'sound{i}.wav', rng.choice(user_ids),
+           (now - timedelta(minutes=i)).isoformat(' ')) for i in range(alarms // 5)])
+    conn.executemany('''
+        INSERT INTO alarm_events (alarm_id, user_id, event, source, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(rng.randint(1, alarms), rng.choice(user_ids), rng.choice(('triggered', 'snoozed', 'dismissed')),
+           'scheduler', (now - timedelta(minutes=i)).isoformat()) for i in range(alarms * 2)])
+    conn.commit()
+
+
+def report(title, plans):
+    """Print the plans; returns the ones not using their index"""
+    print(f"\n{title}")
+    bad = []
+    for plan in plans:
+        print(f"  {'ok  ' if plan['uses_index'] else 'FAIL'} {plan['name']:<28} {plan['plan']}")
+        if not plan['uses_index']:
+            bad.append(plan)
+    return bad
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--alarms', type=int, default=5000)
+    parser.add_argument('--sessions', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    os.chdir(tempfile.mkdtemp(prefix='wecker-plans-'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        from database import get_db, init_database
+        init_database()
+    from migrations import check_query_plans
+
+    conn = get_db()
+    populate(conn, args.alarms, args.sessions)
+    print(f"Scratch database in {os.getcwd()}: {args.alarms} alarms, {args.sessions} sessions")
+
+    bad = report('Without statistics:', check_query_plans(conn))
+    conn.execute('ANALYZE')
+    conn.commit()
+    bad += report('After ANALYZE:', check_query_plans(conn))
+    conn.close()
+
+    if bad:
+        print(f"\n{len(bad)} plan(s) without their index: {', '.join(p['name'] for p in bad)}")
+        return 1
+    print("\nAll hot queries use their indexes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""
+Benchmark suite: API endpoints, managers, scheduler tick, display and audio paths
+
+Runs on a plain Linux box: GPIO uses the simulated backend, pygame is
+replaced by a stub (benchmarks/stubs.py) and all data lives in a temporary
+directory. Every benchmark is measured in several interleaved rounds and
+the fastest round median counts, which keeps short-lived load on the
+machine from showing up as a regression. Results are written as JSON.
+
+Timings are only comparable on the same machine, so there is no shared
+baseline: a plain run only fails if a hot query no longer uses its index.
+Save a baseline on the machine with --save-baseline and compare later runs
+with --baseline; then a benchmark slower than the baseline by more than the
+tolerance also makes the run exit with 1.
+
+Usage:
+    python benchmarks/run.py [--size small|medium|large] [--output results.json]
+                             [--save-baseline [PATH]] [--baseline PATH]
+                             [--tolerance 0.5] [--repeat 3] [--only NAME]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+
+# Datenmengen je Stufe
+SIZES = {
+    'small': {'users': 5, 'alarms': 100, 'sessions': 20, 'sounds': 20},
+    'medium': {'users': 20, 'alarms': 1000, 'sessions': 200, 'sounds': 200},
+    'large': {'users': 100, 'alarms': 10000, 'sessions': 2000, 'sounds': 1000},
+}
+MIN_ITERATIONS = 20
+MAX_ITERATIONS = 2000
+MAX_SECONDS = 0.5  # je Runde
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.5
+NOISE_FLOOR_MS = 0.02  # Kleinere Abweichungen gelten nie als Regression
+
+
+def measure(func, min_iterations=MIN_ITERATIONS, max_seconds=MAX_SECONDS, warmup=3):
+    """Time func repeatedly; returns median/p95/min in milliseconds"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    deadline = time.perf_counter() + max_seconds
+    while len(samples) < min_iterations or (time.perf_counter() < deadline and len(samples) < MAX_ITERATIONS):
+        start = time.perf_counter_ns()
+        func()
+        samples.append((time.perf_counter_ns() - start) / 1e6)
+    samples.sort()
+    return {
+        'median_ms': statistics.median(samples),
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'min_ms': samples[0],
+        'iterations': len(samples)
+    }
+
+
+def combine_rounds(rounds):
+    """Merge the measure() results of several rounds (fastest round median counts)"""
+    medians = [r['median_ms'] for r in rounds]
+    return {
+        'median_ms': min(medians),
+        'p95_ms': statistics.median(r['p95_ms'] for r in rounds),
+        'min_ms': min(r['min_ms'] for r in rounds),
+        'iterations': sum(r['iterations'] for r in rounds),
+        'round_medians_ms': medians
+    }
+
+
+def load_app(workdir):
+    """Import the app against a temporary directory with simulated hardware"""
+    os.environ['WECKER_GPIO_BACKEND'] = 'sim'
+    sys.path.insert(0, BENCH_DIR)
+    sys.path.insert(0, REPO_DIR)
+    from stubs import install_pygame_stub
+    install_pygame_stub()
+
+    os.chdir(workdir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as wecker
+        # Ohne start_background_workers, die Threads würden nur die Messungen stören
+        wecker.create_app()
+    return wecker
+
+
+def populate(wecker, sizes, seed=1):
+    """Create users, sessions, alarms and sound rows"""
+    rng = random.Random(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        user_ids = [wecker.user_manager.create_user(f'bench{i}', 'bench') for i in range(sizes['users'])]
+        for i in range(sizes['sessions']):
+            wecker.session_manager.create_session(rng.choice(user_ids))
+        wecker.alarm_manager.apply_batch(creates=[{
+            'user_id': rng.choice(user_ids),
+            'time': f"{rng.randrange(24):02d}:{rng.randrange(60):02d}",
+            'days': rng.sample(range(7), rng.randint(0, 7)),
+            'enabled': rng.random() < 0.9,
+            'label': f'Alarm {i}'
+        } for i in range(sizes['alarms'])])
+
+    from database import get_db
+    conn = get_db()
+    conn.executemany('''
+        INSERT INTO sounds (filename, original_filename, user_id, processing_status, size, duration_ms)
+        VALUES (?, ?, ?, 'ready', ?, ?)
+    ''', [(f'{i:064x}.wav', f'sound{i}.wav', rng.choice(user_ids), 100000, 3000)
+          for i in range(sizes['sounds'])])
+    conn.commit()
+    conn.close()
+    return user_ids
+
+
+def login(wecker, username, password):
+    client = wecker.app.test_client()
+    response = client.post('/api/auth/login', json={'username': username, 'password': password})
+    if response.status_code != 200:
+        raise SystemExit(f"Login as {username} failed: {response.status_code}")
+    return client
+
+
+def get_ok(client, url):
+    """GET that must answer 200"""
+    def run():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} -> {response.status_code}")
+    return run
+
+
+def revalidate(client, url):
+    """Conditional GET that must answer 304 (ETag taken on the first call)"""
+    headers = {}
+
+    def run():
+        if not headers:
+            headers['If-None-Match'] = client.get(url).headers['ETag']
+        response = client.get(url, headers=headers)
+        if response.status_code != 304:
+            raise RuntimeError(f"GET {url} (If-None-Match) -> {response.status_code}")
+    return run
+
+
+def build_benchmarks(wecker, user_ids):
+    """(name, function, extra info) of every benchmark"""
+    from alarm_scheduler import AlarmScheduler
+    from database import session_cache
+    from display_controller import TM1637Display
+    from gpio_backend import SimulatedGPIO
+    from hardware_controller import HardwareController
+    from sound_manager import SOUNDS_DIR
+
+    admin = login(wecker, 'admin', 'admin')
+    user = login(wecker, 'bench0', 'bench')
+
+    session_ids = [wecker.session_manager.create_session(uid) for uid in user_ids[:20]]
+
+    def session_lookup_uncached():
+        session_cache.clear()
+        wecker.session_manager.get_session(random.choice(session_ids))
+
+    scheduler = AlarmScheduler(wecker.alarm_manager)
+
+    def scheduler_rebuild():
+        scheduler.notify()
+        scheduler.wait_for_due(timeout=0)
+
+    now = datetime.now()
+
+    # Display: jede Iteration eine neue Minute, damit wirklich Segmente wechseln
+    display_gpio = SimulatedGPIO(record=False)
+    display = TM1637Display(gpio=display_gpio)
+    minute = iter(range(10 ** 9))
+
+    def show_time():
+        m = next(minute)
+        display.show_time((m // 60) % 24, m % 60, colon=m % 2 == 0)
+
+    # Kosten eines Frames in GPIO-Operationen (unabhängig von der Maschine)
+    recording_gpio = SimulatedGPIO()
+    recording_display = TM1637Display(gpio=recording_gpio)
+    recording_display.show_time(12, 34)
+    frame_cost = recording_gpio.measure(recording_display.show_time, 12, 35)
+    frame_cost.pop('seconds')
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        hardware = HardwareController(gpio=SimulatedGPIO(record=False))
+        hardware.warm_up_audio()
+    custom_sound = os.path.join(SOUNDS_DIR, 'bench.wav')
+    with open(custom_sound, 'wb') as f:
+        f.write(b'RIFF' + b'\0' * 1024)
+
+    def alarm_sound(sound_file=None):
+        def run():
+            hardware.start_alarm_sound(sound_file=sound_file)
+            hardware.stop_sound()
+        return run
+
+    return [
+        ('api_alarms_admin_full', get_ok(admin, '/api/alarms'), {}),
+        ('api_alarms_admin_not_modified', revalidate(admin, '/api/alarms'), {}),
+        ('api_alarms_admin_page', get_ok(admin, '/api/alarms?limit=50'), {}),
+        ('api_alarms_user', get_ok(user, '/api/alarms'), {}),
+        ('api_status', get_ok(admin, '/api/status'), {}),
+        ('api_status_not_modified', revalidate(admin, '/api/status'), {}),
+        ('api_sounds_admin', get_ok(admin, '/api/sounds'), {}),
+        ('login_required_me', get_ok(user, '/api/auth/me'), {}),
+        ('session_lookup_uncached', session_lookup_uncached, {}),
+        ('check_alarms_due', wecker.alarm_manager.check_alarms, {}),
+        ('check_alarms_at_time', lambda: wecker.alarm_manager.check_alarms(now), {}),
+        ('scheduler_rebuild', scheduler_rebuild, {}),
+        ('display_show_time', show_time, {'gpio_per_frame': frame_cost}),
+        ('alarm_sound_tone', alarm_sound(), {}),
+        ('alarm_sound_custom', alarm_sound(custom_sound), {}),
+    ]
+
+
+def compare(results, baseline, tolerance):
+    """Compare medians against the baseline; returns the regressed names"""
+    regressions = []
+    base_results = baseline.get('results', {})
+    same_size = baseline.get('meta', {}).get('size') == results['meta']['size']
+    base_platform = baseline.get('meta', {}).get('platform')
+    if base_platform and base_platform != results['meta']['platform']:
+        print(f"Baseline was recorded on {base_platform}; "
+              f"save one on this machine with --save-baseline for meaningful comparisons")
+    header = f"\n{'benchmark':<32} {'median ms':>10} {'p95 ms':>10}"
+    print(header + (f" {'baseline':>10} {'change':>8}" if base_results else ''))
+    for name, result in results['results'].items():
+        base = base_results.get(name) if same_size else None
+        line = f"{name:<32} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f}"
+        if base:
+            change = result['median_ms'] / base['median_ms'] - 1 if base['median_ms'] else 0
+            regressed = change > tolerance and result['median_ms'] - base['median_ms'] > NOISE_FLOOR_MS
+            line += f" {base['median_ms']:>10.3f} {change:>+7.0%}" + ('  REGRESSION' if regressed else '')
+            if regressed:
+                regressions.append(name)
+        print(line)
+    if baseline and not same_size:
+        print(f"(baseline was recorded with size '{baseline.get('meta', {}).get('size')}', not compared)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--size', choices=sorted(SIZES), default='small')
+    parser.add_argument('--output', help='Write JSON results to this file')
+    parser.add_argument('--baseline', help='Compare against a baseline saved on this machine')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, metavar='PATH',
+                        help=f'Store results as baseline (default {os.path.relpath(DEFAULT_BASELINE)})')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Allowed slowdown (0.5 = 50%%)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='Measurement rounds per benchmark (fastest round median counts)')
+    parser.add_argument('--only', action='append', help='Run only benchmarks containing this name')
+    args = parser.parse_args(argv)
+
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    if baseline_path and not os.path.exists(baseline_path):
+        parser.error(f"baseline {args.baseline} not found (save one with --save-baseline)")
+    save_path = os.path.abspath(args.save_baseline) if args.save_baseline else None
+    output_path = os.path.abspath(args.output) if args.output else None
+    workdir = tempfile.mkdtemp(prefix='wecker-bench-')
+    sizes = SIZES[args.size]
+
+    wecker = load_app(workdir)
+    user_ids = populate(wecker, sizes)
+
+    results = {
+        'meta': {
+            'size': args.size,
+            'params': sizes,
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': datetime.now().isoformat(timespec='seconds')
+        },
+        'results': {}
+    }
+    benchmarks = [(name, func, info) for name, func, info in build_benchmarks(wecker, user_ids)
+                  if not args.only or any(part in name for part in args.only)]
+    # Runden verschachteln, damit eine kurze Störung nicht alle Runden eines Benchmarks trifft
+    rounds = {name: [] for name, _, _ in benchmarks}
+    for _ in range(max(args.repeat, 1)):
+        for name, func, _ in benchmarks:
+            with contextlib.redirect_stdout(io.StringIO()):
+                rounds[name].append(measure(func))
+    for name, _, info in benchmarks:
+        result = combine_rounds(rounds[name])
+        result.update(info)
+        results['results'][name] = result
+
+    from database import get_db
+    from migrations import check_query_plans
+    conn = get_db()
+    results['query_plans'] = check_query_plans(conn)
+    conn.close()
+
+    baseline = {}
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+
+    bad_plans = [plan for plan in results['query_plans'] if not plan['uses_index']]
+    for plan in bad_plans:
+        print(f"QUERY PLAN: {plan['name']} does not use {plan['index']}: {plan['plan']}")
+    results['regressions'] = regressions + [f"query_plan:{p['name']}" for p in bad_plans]
+
+    if output_path:
+        with open(output_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    if save_path:
+        with open(save_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline saved to {save_path}")
+
+    wecker.cleanup()
+    if results['regressions']:
+        print(f"\n{len(results['regressions'])} regression(s): {', '.join(results['regressions'])}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Recording pygame stand-in for benchmarks on machines without audio
+
+Implements the parts of pygame.mixer and pygame.sndarray the project uses,
+so the alarm start/stop paths run without SDL and without a sound card.
+"""
+import sys
+import types
+
+
+class StubChannel:
+    def __init__(self):
+        self.volume = 1.0
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+
+class StubSound:
+    def __init__(self, file=None, buffer=None, seconds=1.0):
+        self.file = file
+        self.seconds = seconds
+
+    def play(self, loops=0):
+        _state['plays'] += 1
+        return StubChannel()
+
+    def get_length(self):
+        return self.seconds
+
+    def stop(self):
+        pass
+
+
+_state = {'init': None, 'plays': 0}
+
+
+def install_pygame_stub():
+    """Register the stub as `pygame` (replaces a real pygame for this process)"""
+    pygame = types.ModuleType('pygame')
+    mixer = types.ModuleType('pygame.mixer')
+    music = types.ModuleType('pygame.mixer.music')
+    sndarray = types.ModuleType('pygame.sndarray')
+
+    def init(frequency=22050, size=-16, channels=2, buffer=512):
+        _state['init'] = (frequency, size, channels)
+
+    def quit():
+        _state['init'] = None
+
+    mixer.init = init
+    mixer.quit = quit
+    mixer.get_init = lambda: _state['init']
+    mixer.stop = lambda: None
+    mixer.Sound = StubSound
+    mixer.music = music
+    music.load = lambda path: None
+    music.play = lambda loops=0: None
+    music.stop = lambda: None
+    music.get_busy = lambda: False
+
+    def make_sound(array):
+        frequency = (_state['init'] or (22050,))[0]
+        return StubSound(buffer=array, seconds=len(array) / frequency)
+
+    sndarray.make_sound = make_sound
+    sndarray.array = lambda sound: sound.buffer
+
+    pygame.mixer = mixer
+    pygame.sndarray = sndarray
+    pygame.error = RuntimeError
+    pygame.init = lambda: None
+
+    sys.modules.update({
+        'pygame': pygame,
+        'pygame.mixer': mixer,
+        'pygame.mixer.music': music,
+        'pygame.sndarray': sndarray
+    })
+    return pygame
+
+
+def play_count():
+    """Number of Sound.play() calls so far"""
+    return _state['plays']
@@ -1,18 +1,40 @@
+import os
+
 # GPIO Pin Configuration
 TM1637_CLK_PIN = 23  # Clock pin for TM1637 display
 TM1637_DIO_PIN = 24  # Data pin for TM1637 display
 BUTTON_PIN = 18      # Button pin (Button-Modul mit High Level Output)
 SOUND_PIN = 25       # PWM pin for sound output
 
+# GPIO backend: 'rpi' (RPi.GPIO) or 'sim' (simulated; records pin changes only when asked to)
+GPIO_BACKEND = os.environ.get('WECKER_GPIO_BACKEND', 'rpi')
+
 # Web Server Configuration
 WEB_PORT = 5000
 WEB_HOST = '0.0.0.0'  # Listen on all interfaces for remote access
+SSE_MAX_CONNECTIONS = 4  # Gleichzeitige Event-Streams (je ein Server-Thread); weitere Clients pollen
 DEBUG_MODE = False
 
 # Alarm Configuration
 SNOOZE_DURATION_MINUTES = 5  # Default snooze duration
 MAX_ALARMS = 10  # Maximum number of alarms
 
+# Audio Configuration
+MIXER_FREQUENCY = 22050  # pygame mixer sample rate (Hz)
+MIXER_SIZE = -16         # Signed 16-bit samples
+MIXER_CHANNELS = 2       # Stereo
+MIXER_BUFFER = 512
+SOUND_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Speicherbudget für dekodierte Sounds
+SOUND_PRELOAD_ALARMS = 3  # Sounds der nächsten N Alarme vorab dekodieren
+ALARM_TONE_PATTERN = 'beep'  # 'beep', 'multi', 'chirp', 'pulsed' oder 'escalating'
+ALARM_TONE_FREQUENCY = 800   # Grundfrequenz des Standard-Alarmtons (Hz)
+ALARM_TONE_ESCALATION_SECONDS = 30  # Dauer bis zur vollen Lautstärke bei 'escalating'
+MAX_SOUND_UPLOAD_BYTES = 10 * 1024 * 1024  # Maximale Größe einer hochgeladenen Sound-Datei
+AUDIO_WORKERS = 1  # Threads für die Normalisierung hochgeladener Sounds
+
 # Display Configuration
 DISPLAY_BRIGHTNESS = 7  # 0-7 (7 is brightest)
 
+
+# Profiling (/api/profiler, nur Admins)
+PROFILER_SAMPLE_INTERVAL_MS = 5  # Abstand der Stack-Samples für Flamegraphs
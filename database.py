@@ -4,90 +4,184 @@ Database management for users, alarms, settings, and sounds
 import sqlite3
 import os
 import hashlib
+import queue
 import secrets
+import time
+from collections import OrderedDict
 from datetime import datetime
 from threading import Lock
+from migrations import migrate
+from metrics import registry, observe_query
 
 DATABASE_FILE = 'wecker.db'
 db_lock = Lock()
 
+# Connection-Pool: offene Verbindungen werden wiederverwendet statt pro Query neu geöffnet
+DB_POOL_SIZE = 4              # Maximal gehaltene freie Verbindungen
+DB_BUSY_TIMEOUT = 5.0         # Sekunden, die SQLite selbst auf Locks wartet
+DB_BUSY_RETRIES = 5           # Zusätzliche Versuche bei SQLITE_BUSY
+DB_BUSY_BACKOFF = 0.05        # Start-Wartezeit (verdoppelt sich pro Versuch)
+DB_STATEMENT_CACHE = 128      # Prepared Statements pro Verbindung
+DB_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',   # Mit WAL sicher, spart fsync pro Commit
+    'PRAGMA cache_size=-2000',     # 2 MB Page-Cache
+    'PRAGMA mmap_size=8388608',    # 8 MB Memory-Mapped I/O
+    'PRAGMA temp_store=MEMORY',
+)
 
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE_FILE)
+_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+_initialized = set()  # Datenbankdateien, deren Schema in diesem Prozess schon geprüft wurde
+
+# Session-Cache vor SessionManager.get_session (login_required)
+SESSION_CACHE_TTL = 30        # Sekunden bis ein Eintrag neu aus der DB geladen wird
+SESSION_CACHE_SIZE = 256      # Maximale Anzahl Einträge (LRU)
+
+
+def open_connection():
+    """Open a dedicated (unpooled) connection with the standard pragmas"""
+    conn = sqlite3.connect(DATABASE_FILE, timeout=DB_BUSY_TIMEOUT,
+                           check_same_thread=False,
+                           cached_statements=DB_STATEMENT_CACHE)
     conn.row_factory = sqlite3.Row
+    for pragma in DB_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
+def _is_busy(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def _with_retry(func, *args):
+    """Call func, retrying with exponential backoff while the database is busy"""
+    for attempt in range(DB_BUSY_RETRIES + 1):
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == DB_BUSY_RETRIES:
+                raise
+            time.sleep(DB_BUSY_BACKOFF * (2 ** attempt))
+
+
+def _timed(sql, func, *args):
+    """_with_retry plus per-statement timing for /api/metrics (includes busy waits)"""
+    start = time.perf_counter()
+    try:
+        return _with_retry(func, *args)
+    finally:
+        observe_query(sql, time.perf_counter() - start)
+
+
+def _release(conn):
+    """Return a connection to the pool (or close it if the pool is full)"""
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        _pool.put_nowait(conn)
+    except (queue.Full, sqlite3.Error):
+        conn.close()
+
+
+class PooledCursor:
+    """Cursor wrapper that retries statements on SQLITE_BUSY"""
+    _cursor = None
+    
+    def __init__(self, cursor):
+        self._cursor = cursor
+    
+    def execute(self, sql, parameters=()):
+        _timed(sql, self._cursor.execute, sql, parameters)
+        return self
+    
+    def executemany(self, sql, seq_of_parameters):
+        _timed(sql, self._cursor.executemany, sql, seq_of_parameters)
+        return self
+    
+    def __iter__(self):
+        return iter(self._cursor)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class PooledConnection:
+    """Connection handle from the pool; close() hands the connection back"""
+    _conn = None
+    
+    def __init__(self, conn):
+        self._conn = conn
+    
+    def cursor(self):
+        return PooledCursor(self._conn.cursor())
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+    
+    def commit(self):
+        _timed('COMMIT', self._conn.commit)
+    
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            registry.inc('wecker_db_connections_in_use', -1)
+            _release(conn)
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def __del__(self):
+        # Nicht geschlossene Handles (z.B. nach Exceptions) geben die Verbindung trotzdem zurück
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def get_db():
+    """Get database connection from the pool"""
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = open_connection()
+        registry.inc('wecker_db_connections_opened_total')
+    registry.inc('wecker_db_checkouts_total')
+    registry.inc('wecker_db_connections_in_use')
+    return PooledConnection(conn)
+
+
+def close_all_connections():
+    """Close all idle pooled connections"""
+    while True:
+        try:
+            _pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+
 def init_database():
-    """Initialize database with all tables"""
+    """Initialize database with all tables (once per process and database file)
+
+    The managers call this on construction; after the first call it
+    returns immediately.
+    """
+    with db_lock:
+        if DATABASE_FILE in _initialized:
+            return
+        _init_schema()
+        _initialized.add(DATABASE_FILE)
+
+
+def _init_schema():
     conn = get_db()
     cursor = conn.cursor()
     
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT NOT NULL DEFAULT 'user',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP
-        )
-    ''')
-    
-    # Alarms table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS alarms (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            time TEXT NOT NULL,
-            days TEXT,
-            enabled INTEGER DEFAULT 1,
-            label TEXT,
-            sound_file TEXT,
-            snooze_allowed INTEGER DEFAULT 1,
-            snooze_duration INTEGER DEFAULT 5,
-            snooze_until TIMESTAMP,
-            last_triggered TIMESTAMP,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-    ''')
-    
-    # Settings table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS settings (
-            key TEXT PRIMARY KEY,
-            value TEXT NOT NULL,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Sounds table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sounds (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            original_filename TEXT NOT NULL,
-            user_id INTEGER,
-            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-    ''')
-    
-    # Sessions table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS sessions (
-            session_id TEXT PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-    ''')
-    
-    conn.commit()
+    # Tabellen und Indizes über versionierte Migrationen anlegen
+    migrate(conn)
     
     # Create default admin user if no users exist
     cursor.execute('SELECT COUNT(*) FROM users')
@@ -105,6 +199,81 @@ def init_database():
     conn.close()
 
 
+class SessionCache:
+    """In-process TTL/LRU cache of session lookups"""
+    def __init__(self, ttl=SESSION_CACHE_TTL, max_size=SESSION_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # session_id -> (expires, session info)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, session_id):
+        """Get cached session info or None"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[session_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return dict(entry[1])
+    
+    def put(self, session_id, info, expires_at=None):
+        """Cache session info until the TTL or the session's own expiry, whichever is first"""
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, (expires_at - datetime.now()).total_seconds())
+            if ttl <= 0:
+                return
+        with self._lock:
+            self._entries[session_id] = (time.monotonic() + ttl, dict(info))
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, session_id):
+        """Drop a single session"""
+        with self._lock:
+            self._entries.pop(session_id, None)
+    
+    def invalidate_user(self, user_id):
+        """Drop all sessions of a user (password changed)"""
+        with self._lock:
+            for session_id in [k for k, v in self._entries.items() if v[1]['user_id'] == user_id]:
+                del self._entries[session_id]
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        """Get hit/miss counters"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._entries)
+            }
+
+
+session_cache = SessionCache()
+
+registry.callback('wecker_db_pool_idle_connections', 'gauge', 'Idle connections waiting in the pool', _pool.qsize)
+registry.callback('wecker_session_cache_lookups_total', 'counter', 'Session cache lookups by result',
+                  lambda: [((('result', 'hit'),), session_cache.hits), ((('result', 'miss'),), session_cache.misses)])
+registry.callback('wecker_session_cache_evictions_total', 'counter', 'Sessions evicted from the cache (LRU)',
+                  lambda: session_cache.evictions)
+registry.callback('wecker_session_cache_entries', 'gauge', 'Sessions currently cached',
+                  lambda: session_cache.stats()['size'])
+
+
 def hash_password(password):
     """Hash a password using SHA256 with salt"""
     salt = secrets.token_hex(16)
@@ -208,6 +377,7 @@ class UserManager:
         ''', (new_hash, user_id))
         conn.commit()
         conn.close()
+        session_cache.invalidate_user(user_id)
         return True
     
     def get_all_users(self):
@@ -244,6 +414,10 @@ class SessionManager:
     
     def get_session(self, session_id):
         """Get session and user info"""
+        cached = session_cache.get(session_id)
+        if cached:
+            return cached
+        
         conn = get_db()
         cursor = conn.cursor()
         
@@ -257,13 +431,18 @@ class SessionManager:
         conn.close()
         
         if session:
-            return {
+            info = {
                 'id': session['user_id'],  # 'id' für Konsistenz mit dem Rest des Codes
                 'user_id': session['user_id'],  # Behalte auch user_id für Rückwärtskompatibilität
                 'username': session['username'],
                 'role': session['role'],
                 'session_id': session['session_id']
             }
+            expires_at = session['expires_at']
+            if isinstance(expires_at, str):
+                expires_at = datetime.fromisoformat(expires_at)
+            session_cache.put(session_id, info, expires_at)
+            return info
         return None
     
     def delete_session(self, session_id):
@@ -273,6 +452,7 @@ class SessionManager:
         cursor.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
         conn.commit()
         conn.close()
+        session_cache.invalidate(session_id)
     
     def cleanup_expired_sessions(self):
         """Remove expired sessions"""
@@ -281,6 +461,11 @@ class SessionManager:
         cursor.execute('DELETE FROM sessions WHERE expires_at < CURRENT_TIMESTAMP')
         conn.commit()
         conn.close()
+        session_cache.clear()
+    
+    def cache_stats(self):
+        """Get session cache hit/miss counters"""
+        return session_cache.stats()
 
 
 class SettingsManager:
@@ -1,30 +1,107 @@
 """
 Database-based alarm management system
 """
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time as dt_time
+from functools import lru_cache
 import json
-from database import get_db
+from threading import RLock
+from alarm_manager import AlarmTime
+from database import get_db, open_connection
 
 
-class DBAlarm:
+def _days_json(days):
+    """Serialize a weekday list for the days column (empty -> NULL)"""
+    if not days:
+        return None
+    return json.dumps(days if isinstance(days, list) else list(days))
+
+
+def _iso(value):
+    """Format a timestamp for next_fire_at (whole seconds, sorts as text)"""
+    return value.isoformat(timespec='seconds') if value else None
+
+
+def _merged(fields, key, current):
+    """Value of a batch update field (None keeps the current value)"""
+    value = fields.get(key)
+    return current if value is None else value
+
+
+# Abfragen auf next_fire_at (migrations.hot_queries prüft ihre Query-Pläne)
+DUE_ALARMS_SQL = 'SELECT * FROM alarms WHERE next_fire_at <= ?'
+STALE_NEXT_FIRE_SQL = 'SELECT id FROM alarms WHERE next_fire_at < ?'
+FIRE_TIMES_SQL = 'SELECT next_fire_at, id FROM alarms WHERE next_fire_at IS NOT NULL ORDER BY next_fire_at'
+NEXT_ALARM_SQL = 'SELECT * FROM alarms WHERE next_fire_at >= ? ORDER BY next_fire_at LIMIT 1'
+NEXT_USER_ALARM_SQL = 'SELECT * FROM alarms WHERE user_id = ? AND next_fire_at >= ? ORDER BY next_fire_at LIMIT 1'
+PASSED_ALARMS_SQL = 'SELECT * FROM alarms WHERE next_fire_at < ?'
+PASSED_USER_ALARMS_SQL = 'SELECT * FROM alarms WHERE user_id = ? AND next_fire_at < ?'
+
+
+def alarm_query_sql(user_id=None, enabled=None, weekday=None, time_from=None,
+                    time_to=None, label_prefix=None, after=None, limit=50):
+    """Build the SQL and parameters of DBAlarmManager.query_alarms (one row more than limit)"""
+    conditions = []
+    values = []
+    if user_id is not None:
+        conditions.append('user_id = ?')
+        values.append(user_id)
+    if enabled is not None:
+        # Mit Benutzer-Filter soll idx_alarms_user_time greifen, nicht alle aktiven Alarme (+ sperrt den Index)
+        conditions.append('+enabled = ?' if user_id is not None else 'enabled = ?')
+        values.append(1 if enabled else 0)
+    if weekday is not None:
+        # Alarme ohne Tage klingeln täglich
+        conditions.append('(days IS NULL OR EXISTS (SELECT 1 FROM json_each(alarms.days) WHERE value = ?))')
+        values.append(weekday)
+    if time_from is not None:
+        conditions.append('time >= ?')
+        values.append(time_from)
+    if time_to is not None:
+        conditions.append('time <= ?')
+        values.append(time_to)
+    if label_prefix:
+        conditions.append('substr(label, 1, ?) = ?')
+        values.extend([len(label_prefix), label_prefix])
+    if after is not None:
+        conditions.append('(time, id) > (?, ?)')
+        values.extend(after)
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    # Eine Zeile mehr laden, um zu wissen, ob es eine weitere Seite gibt
+    return f'SELECT * FROM alarms {where} ORDER BY time, id LIMIT ?', values + [limit + 1]
+
+
+@lru_cache(maxsize=512)
+def _parse_days(days_value):
+    """Decode the days column once per distinct value"""
+    return tuple(json.loads(days_value)) if days_value else ()
+
+
+class DBAlarm(AlarmTime):
+    __slots__ = ('id', 'user_id', 'enabled', 'label', 'sound_file', 'snooze_allowed',
+                 'snooze_duration', 'snooze_until', 'last_triggered', 'next_fire_at')
+
     def __init__(self, row):
-        # sqlite3.Row hat kein .get(), verwende Dictionary-Syntax
+        # sqlite3.Row hat kein .get(): einmal in ein Dictionary umwandeln
+        row = dict(row)
         self.id = row['id']
-        self.user_id = row['user_id'] if 'user_id' in row.keys() else None
+        self.user_id = row.get('user_id')
         self.time_str = row['time']
         # days kann None sein oder ein JSON-String
-        days_value = row['days'] if 'days' in row.keys() else None
-        self.days = json.loads(days_value) if days_value else []
+        self.days = list(_parse_days(row.get('days')))
         self.enabled = bool(row['enabled'])
-        self.label = row['label'] if 'label' in row.keys() and row['label'] else ''
-        self.sound_file = row['sound_file'] if 'sound_file' in row.keys() and row['sound_file'] else None
-        self.snooze_allowed = bool(row['snooze_allowed'] if 'snooze_allowed' in row.keys() else 1)
-        self.snooze_duration = row['snooze_duration'] if 'snooze_duration' in row.keys() else 5
+        self.label = row.get('label') or ''
+        self.sound_file = row.get('sound_file') or None
+        self.snooze_allowed = bool(row.get('snooze_allowed', 1))
+        self.snooze_duration = row.get('snooze_duration', 5)
         # snooze_until und last_triggered können None sein
-        snooze_until_val = row['snooze_until'] if 'snooze_until' in row.keys() and row['snooze_until'] else None
+        snooze_until_val = row.get('snooze_until')
         self.snooze_until = datetime.fromisoformat(snooze_until_val) if snooze_until_val else None
-        last_triggered_val = row['last_triggered'] if 'last_triggered' in row.keys() and row['last_triggered'] else None
+        last_triggered_val = row.get('last_triggered')
         self.last_triggered = datetime.fromisoformat(last_triggered_val) if last_triggered_val else None
+        # Gespeichertes nächstes Vorkommen (siehe DBAlarmManager._store_next_fire)
+        next_fire_val = row.get('next_fire_at')
+        self.next_fire_at = datetime.fromisoformat(next_fire_val) if next_fire_val else None
     
     def to_dict(self):
         """Convert alarm to dictionary"""
@@ -39,7 +116,8 @@ class DBAlarm:
             'snooze_allowed': self.snooze_allowed,
             'snooze_duration': self.snooze_duration,
             'snooze_until': self.snooze_until.isoformat() if self.snooze_until else None,
-            'last_triggered': self.last_triggered.isoformat() if self.last_triggered else None
+            'last_triggered': self.last_triggered.isoformat() if self.last_triggered else None,
+            'next_fire_at': self.next_fire_at.isoformat() if self.next_fire_at else None
         }
     
     def should_trigger(self, current_time=None):
@@ -51,22 +129,15 @@ class DBAlarm:
             current_time = datetime.now()
         
         # Check if snoozed
-        if self.snooze_until and current_time < self.snooze_until:
-            return False
-        
-        # Parse alarm time
-        hour, minute = map(int, self.time_str.split(':'))
-        alarm_time = current_time.replace(hour=hour, minute=minute, second=0, microsecond=0)
-        
-        # Check if it's the right day
-        if self.days:
-            weekday = current_time.weekday()  # 0=Monday, 6=Sunday
-            if weekday not in self.days:
+        if self.snooze_until:
+            if current_time < self.snooze_until:
                 return False
+            # Snooze abgelaufen: innerhalb von 1 Minute erneut auslösen
+            if (current_time - self.snooze_until).total_seconds() <= 60:
+                return True
         
-        # Check if time matches (within 1 minute window)
-        time_diff = abs((current_time - alarm_time).total_seconds())
-        if time_diff <= 60:  # 1 minute window
+        # Check day and time (within 1 minute window)
+        if self.in_window(current_time):
             # Check if we already triggered this alarm today
             if self.last_triggered:
                 if self.last_triggered.date() == current_time.date():
@@ -74,12 +145,157 @@ class DBAlarm:
             return True
         
         return False
+    
+    def next_trigger_time(self, after=None):
+        """Get the next scheduled occurrence whose trigger window is still open at `after`
+        
+        Returns the snooze deadline or the HH:MM occurrence (which may lie up to
+        one minute before `after`), or None if the alarm will not fire.
+        """
+        if not self.enabled:
+            return None
+        
+        if after is None:
+            after = datetime.now()
+        window = timedelta(seconds=60)
+        
+        if self.snooze_until and self.snooze_until + window >= after:
+            return self.snooze_until
+        
+        if self.minute_of_day is None:
+            return None
+        hour, minute = divmod(self.minute_of_day, 60)
+        for offset in range(8):
+            day = after.date() + timedelta(days=offset)
+            candidate = datetime.combine(day, dt_time(hour, minute))
+            if candidate + window < after:
+                continue
+            if not (self.day_mask >> candidate.weekday()) & 1:
+                continue
+            if self.last_triggered and self.last_triggered.date() == day:
+                continue
+            return candidate
+        
+        return None
+    
+    def next_undispatched(self, after, dispatched=None):
+        """Like next_trigger_time, but skip occurrences up to `dispatched` (already fired)"""
+        fire_at = self.next_trigger_time(after)
+        if fire_at and dispatched and fire_at <= dispatched:
+            fire_at = self.next_trigger_time(dispatched + timedelta(seconds=61))
+        return fire_at
 
 
 class DBAlarmManager:
     def __init__(self):
         from database import init_database
         init_database()
+        
+        # Write-through Cache: die eigenen Schreibmethoden halten ihn aktuell,
+        # der Zähler in alarm_changes (Trigger) erkennt Änderungen durch andere Verbindungen
+        self._cache_lock = RLock()
+        self._alarms = {}       # id -> DBAlarm
+        self._user_index = {}   # user_id -> set(alarm ids)
+        self._sorted = None     # nach (time, id) sortierte Alarme, lazy
+        self._generation = 0    # Zählt jede Änderung am Index (für ETags)
+        self._data_version = None
+        self._alarm_version = None
+        self._next_memo = {}    # user_id -> (generation, berechnet um, gültig bis, Alarm)
+        self._version_conn = open_connection()
+        self._reload_cache()
+    
+    def _read_data_version(self):
+        """Read PRAGMA data_version from the dedicated watch connection"""
+        return self._version_conn.execute('PRAGMA data_version').fetchone()[0]
+    
+    def _read_alarm_version(self):
+        """Read the alarm change counter (bumped by triggers on every alarm write)"""
+        return self._version_conn.execute('SELECT version FROM alarm_changes WHERE id = 1').fetchone()[0]
+    
+    def _reload_cache(self):
+        """Load all alarms into the in-memory index"""
+        with self._cache_lock:
+            data_version = self._read_data_version()
+            alarm_version = self._read_alarm_version()
+            conn = get_db()
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM alarms')
+            rows = cursor.fetchall()
+            conn.close()
+            
+            self._alarms = {}
+            self._user_index = {}
+            for row in rows:
+                self._index(DBAlarm(row))
+            self._sorted = None
+            self._generation += 1
+            self._data_version = data_version
+            self._alarm_version = alarm_version
+    
+    def _sync_cache(self):
+        """Reload the index if another connection changed the alarms"""
+        with self._cache_lock:
+            # data_version ändert sich bei jedem fremden Commit, egal auf welche Tabelle;
+            # es spart nur das Lesen des Zählers, wenn niemand etwas geschrieben hat
+            data_version = self._read_data_version()
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            if self._read_alarm_version() != self._alarm_version:
+                self._reload_cache()
+    
+    def _index(self, alarm):
+        old = self._alarms.get(alarm.id)
+        if old is not None and old.user_id != alarm.user_id:
+            self._user_index.get(old.user_id, set()).discard(alarm.id)
+        self._alarms[alarm.id] = alarm
+        self._user_index.setdefault(alarm.user_id, set()).add(alarm.id)
+    
+    def _cache_store(self, alarm=None, removed_id=None, alarms=(), removed_ids=()):
+        """Apply own writes to the index and mark it as in sync"""
+        with self._cache_lock:
+            for stored in ([alarm] if alarm is not None else []) + list(alarms):
+                self._index(stored)
+            for alarm_id in ([removed_id] if removed_id is not None else []) + list(removed_ids):
+                old = self._alarms.pop(alarm_id, None)
+                if old is not None:
+                    self._user_index.get(old.user_id, set()).discard(alarm_id)
+            self._sorted = None
+            self._generation += 1
+            # Eigene Commits ändern data_version und den Zähler ebenfalls
+            self._data_version = self._read_data_version()
+            self._alarm_version = self._read_alarm_version()
+    
+    def data_generation(self):
+        """Get a counter that changes whenever any alarm changes"""
+        with self._cache_lock:
+            self._sync_cache()
+            return self._generation
+    
+    def _sorted_alarms(self):
+        if self._sorted is None:
+            self._sorted = sorted(self._alarms.values(), key=lambda a: (a.time_str, a.id))
+        return self._sorted
+    
+    def _store_next_fire(self, cursor, alarms, now=None):
+        """Recompute next_fire_at of written rows inside the writing transaction"""
+        if now is None:
+            now = datetime.now()
+        values = []
+        for alarm in alarms:
+            fire_at = alarm.next_trigger_time(now)
+            alarm.next_fire_at = fire_at.replace(microsecond=0) if fire_at else None
+            values.append((_iso(alarm.next_fire_at), alarm.id))
+        cursor.executemany('UPDATE alarms SET next_fire_at = ? WHERE id = ?', values)
+    
+    def _fetch_row(self, cursor, alarm_id):
+        """Read a freshly written row and store its next occurrence"""
+        cursor.execute('SELECT * FROM alarms WHERE id = ?', (alarm_id,))
+        row = cursor.fetchone()
+        alarm = DBAlarm(row) if row else None
+        if alarm:
+            self._store_next_fire(cursor, [alarm])
+        return alarm
     
     def add_alarm(self, user_id, time_str, days=None, enabled=True, label="", 
                   sound_file=None, snooze_allowed=True, snooze_duration=5):
@@ -89,13 +305,7 @@ class DBAlarmManager:
             cursor = conn.cursor()
             
             # Konvertiere days zu JSON-String
-            if days is None:
-                days_json = None
-            elif isinstance(days, list):
-                days_json = json.dumps(days) if days else None
-            else:
-                # Falls days kein List ist, versuche es zu konvertieren
-                days_json = json.dumps(list(days)) if days else None
+            days_json = _days_json(days)
             
             # Debug-Logging
             print(f"DB: Adding alarm - user_id={user_id}, time={time_str}, days_json={days_json}")
@@ -108,12 +318,14 @@ class DBAlarmManager:
                   snooze_allowed, snooze_duration))
             
             alarm_id = cursor.lastrowid
+            result = self._fetch_row(cursor, alarm_id)
             conn.commit()
             conn.close()
             
-            result = self.get_alarm(alarm_id)
             if not result:
                 print(f"Error: Alarm {alarm_id} was created but could not be retrieved")
+            else:
+                self._cache_store(result)
             return result
         except Exception as e:
             print(f"Error in add_alarm: {e}")
@@ -123,33 +335,44 @@ class DBAlarmManager:
     
     def get_alarm(self, alarm_id):
         """Get alarm by ID"""
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM alarms WHERE id = ?', (alarm_id,))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return DBAlarm(row)
-        return None
+        with self._cache_lock:
+            self._sync_cache()
+            return self._alarms.get(alarm_id)
     
     def get_user_alarms(self, user_id):
         """Get all alarms for a user"""
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM alarms WHERE user_id = ? ORDER BY time', (user_id,))
-        alarms = [DBAlarm(row) for row in cursor.fetchall()]
-        conn.close()
-        return alarms
+        with self._cache_lock:
+            self._sync_cache()
+            ids = self._user_index.get(user_id)
+            if not ids:
+                return []
+            return sorted((self._alarms[i] for i in ids), key=lambda a: (a.time_str, a.id))
     
     def get_all_alarms(self):
         """Get all alarms (admin only)"""
+        with self._cache_lock:
+            self._sync_cache()
+            return list(self._sorted_alarms())
+    
+    def query_alarms(self, user_id=None, enabled=None, weekday=None, time_from=None,
+                     time_to=None, label_prefix=None, after=None, limit=50):
+        """Get one page of alarms ordered by (time, id), filtered in SQL
+        
+        after is the (time, id) of the last alarm of the previous page
+        (keyset pagination). Returns (alarms, next_after) where next_after
+        is None on the last page.
+        """
+        sql, values = alarm_query_sql(user_id, enabled, weekday, time_from, time_to,
+                                      label_prefix, after, limit)
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM alarms ORDER BY time')
-        alarms = [DBAlarm(row) for row in cursor.fetchall()]
+        cursor.execute(sql, values)
+        rows = cursor.fetchall()
         conn.close()
-        return alarms
+        
+        alarms = [DBAlarm(row) for row in rows[:limit]]
+        next_after = (alarms[-1].time_str, alarms[-1].id) if len(rows) > limit else None
+        return alarms, next_after
     
     def update_alarm(self, alarm_id, user_id=None, time_str=None, days=None, 
                     enabled=None, label=None, sound_file=None, 
@@ -162,9 +385,6 @@ class DBAlarmManager:
         # Check permission (user can only update their own alarms unless admin)
         # This will be checked in the API layer
         
-        conn = get_db()
-        cursor = conn.cursor()
-        
         updates = []
         values = []
         
@@ -190,15 +410,24 @@ class DBAlarmManager:
             updates.append('snooze_duration = ?')
             values.append(snooze_duration)
         
-        if updates:
-            values.append(alarm_id)
-            cursor.execute(f'''
-                UPDATE alarms SET {', '.join(updates)} WHERE id = ?
-            ''', values)
-            conn.commit()
+        if not updates:
+            return alarm
         
+        conn = get_db()
+        cursor = conn.cursor()
+        values.append(alarm_id)
+        cursor.execute(f'''
+            UPDATE alarms SET {', '.join(updates)} WHERE id = ?
+        ''', values)
+        result = self._fetch_row(cursor, alarm_id)
+        conn.commit()
         conn.close()
-        return self.get_alarm(alarm_id)
+        
+        if result:
+            self._cache_store(result)
+        else:
+            self._cache_store(removed_id=alarm_id)
+        return result
     
     def delete_alarm(self, alarm_id):
         """Delete an alarm"""
@@ -208,26 +437,236 @@ class DBAlarmManager:
         deleted = cursor.rowcount > 0
         conn.commit()
         conn.close()
+        self._cache_store(removed_id=alarm_id)
         return deleted
     
-    def check_alarms(self, current_time=None):
-        """Check which alarms should trigger"""
-        if current_time is None:
-            current_time = datetime.now()
+    def apply_batch(self, creates=(), updates=(), deletes=()):
+        """Apply many creates, updates and deletes in one transaction
         
+        creates: dicts with user_id, time and optional alarm fields
+        updates: (alarm_id, fields) pairs; fields set to None stay unchanged
+        deletes: alarm ids
+        Returns (created alarms, updated alarms, deleted ids) in input order.
+        Nothing is applied if any item fails.
+        """
         conn = get_db()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM alarms WHERE enabled = 1')
-        alarms = [DBAlarm(row) for row in cursor.fetchall()]
-        conn.close()
+        with self._cache_lock:
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                # Schreibsperre gehalten: Cache entspricht jetzt exakt der Datenbank
+                self._sync_cache()
+                
+                if deletes:
+                    missing = [i for i in deletes if i not in self._alarms]
+                    if missing:
+                        raise KeyError(f"Alarm {missing[0]} not found")
+                    cursor.executemany('DELETE FROM alarms WHERE id = ?', [(i,) for i in deletes])
+                
+                if updates:
+                    rows = []
+                    for alarm_id, fields in updates:
+                        alarm = self._alarms.get(alarm_id)
+                        if alarm is None or alarm_id in deletes:
+                            raise KeyError(f"Alarm {alarm_id} not found")
+                        # Vollständige Zeile aus Cache + Änderungen (None = unverändert)
+                        rows.append((_merged(fields, 'time', alarm.time_str),
+                                     _days_json(_merged(fields, 'days', alarm.days)),
+                                     _merged(fields, 'enabled', alarm.enabled),
+                                     _merged(fields, 'label', alarm.label),
+                                     _merged(fields, 'sound_file', alarm.sound_file),
+                                     _merged(fields, 'snooze_allowed', alarm.snooze_allowed),
+                                     _merged(fields, 'snooze_duration', alarm.snooze_duration), alarm_id))
+                    cursor.executemany('''
+                        UPDATE alarms SET time = ?, days = ?, enabled = ?, label = ?, sound_file = ?,
+                                          snooze_allowed = ?, snooze_duration = ?
+                        WHERE id = ?
+                    ''', rows)
+                
+                created = []
+                if creates:
+                    # AUTOINCREMENT vergibt die neuen IDs aufsteigend oberhalb der Sequenz
+                    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'alarms'")
+                    last_id = cursor.fetchone()[0]
+                    cursor.executemany('''
+                        INSERT INTO alarms (user_id, time, days, enabled, label, sound_file,
+                                            snooze_allowed, snooze_duration)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', [(c['user_id'], c['time'], _days_json(c.get('days')), c.get('enabled', True),
+                           c.get('label', ''), c.get('sound_file'), c.get('snooze_allowed', True),
+                           c.get('snooze_duration', 5)) for c in creates])
+                    cursor.execute('SELECT * FROM alarms WHERE id > ? ORDER BY id', (last_id,))
+                    created = [DBAlarm(row) for row in cursor.fetchall()]
+                    if len(created) != len(creates):
+                        raise RuntimeError("Created alarms could not be retrieved")
+                
+                updated = []
+                if updates:
+                    cursor.execute('''
+                        SELECT * FROM alarms WHERE id IN (SELECT value FROM json_each(?))
+                    ''', (json.dumps([alarm_id for alarm_id, _ in updates]),))
+                    by_id = {row['id']: DBAlarm(row) for row in cursor.fetchall()}
+                    updated = [by_id[alarm_id] for alarm_id, _ in updates]
+                
+                self._store_next_fire(cursor, created + updated)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                conn.close()
+                raise
+            conn.close()
+            
+            self._cache_store(alarms=created + updated, removed_ids=deletes)
+        return created, updated, list(deletes)
+    
+    def check_alarms(self, current_time=None):
+        """Check which alarms should trigger
+        
+        For the current time this is an indexed next_fire_at query
+        (due_alarms); other times are evaluated against all cached alarms.
+        """
+        if current_time is None:
+            return self.due_alarms()
         
         triggered = []
-        for alarm in alarms:
-            if alarm.should_trigger(current_time):
+        for alarm in self.get_all_alarms():
+            if alarm.enabled and alarm.should_trigger(current_time):
                 triggered.append(alarm)
         
         return triggered
     
+    def due_alarms(self, now=None):
+        """Get the alarms that trigger now with one range query on next_fire_at
+        
+        Only rows whose stored occurrence lies within a minute of now are
+        read (should_trigger fires up to a minute early). Rows whose
+        occurrence passed without being dismissed are moved on to their
+        next one.
+        """
+        if now is None:
+            now = datetime.now()
+        window = timedelta(seconds=60)
+        
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(DUE_ALARMS_SQL, (_iso(now + window),))
+        candidates = sorted((DBAlarm(row) for row in cursor.fetchall()), key=lambda a: (a.time_str, a.id))
+        conn.close()
+        
+        stale = [a.id for a in candidates if a.next_fire_at + window < now]
+        if stale:
+            self._refresh_next_fire(stale, now)
+        return [a for a in candidates if a.should_trigger(now)]
+    
+    def refresh_next_fire(self, now=None, missing=False):
+        """Move rows whose stored occurrence has passed on to their next one
+        
+        missing=True also fills in enabled rows without next_fire_at (e.g.
+        inserted by another program). Only changed rows are written.
+        """
+        if now is None:
+            now = datetime.now()
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(STALE_NEXT_FIRE_SQL, (_iso(now - timedelta(seconds=60)),))
+        alarm_ids = [row['id'] for row in cursor.fetchall()]
+        if missing:
+            cursor.execute('SELECT id FROM alarms WHERE enabled = 1 AND next_fire_at IS NULL')
+            alarm_ids += [row['id'] for row in cursor.fetchall()]
+        conn.close()
+        if alarm_ids:
+            self._refresh_next_fire(alarm_ids, now)
+    
+    def advance_next_fire(self, dispatched, now=None):
+        """Store the occurrence after the one the scheduler just dispatched
+        
+        dispatched: alarm_id -> dispatched occurrence
+        """
+        self._refresh_next_fire(list(dispatched), now or datetime.now(), dispatched)
+    
+    def fire_times(self):
+        """Get (next_fire_at, alarm_id) of all alarms that will fire, earliest first"""
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute(FIRE_TIMES_SQL)
+        rows = cursor.fetchall()
+        conn.close()
+        return [(datetime.fromisoformat(row['next_fire_at']), row['id']) for row in rows]
+    
+    def _refresh_next_fire(self, alarm_ids, now, dispatched=None):
+        """Recompute next_fire_at of the given rows; writes only values that changed"""
+        dispatched = dispatched or {}
+        conn = get_db()
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            # Innerhalb der Sperre neu lesen, parallele Änderungen nicht überschreiben
+            cursor.execute('''
+                SELECT * FROM alarms WHERE id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(alarm_ids),))
+            changed = []
+            for alarm in (DBAlarm(row) for row in cursor.fetchall()):
+                fire_at = alarm.next_undispatched(now, dispatched.get(alarm.id))
+                fire_at = fire_at.replace(microsecond=0) if fire_at else None
+                if fire_at != alarm.next_fire_at:
+                    alarm.next_fire_at = fire_at
+                    changed.append(alarm)
+            cursor.executemany('UPDATE alarms SET next_fire_at = ? WHERE id = ?',
+                               [(_iso(a.next_fire_at), a.id) for a in changed])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            conn.close()
+            raise
+        conn.close()
+        if changed:
+            self._cache_store(alarms=changed)
+    
+    def next_alarm(self, user_id=None, now=None):
+        """Get the alarm with the earliest upcoming occurrence (or None), read-only
+        
+        The result is memoized until the alarms change or its one-minute
+        window closes, so status polls usually need no query at all.
+        """
+        if now is None:
+            now = datetime.now()
+        window = timedelta(seconds=60)
+        with self._cache_lock:
+            self._sync_cache()
+            generation = self._generation
+            memo = self._next_memo.get(user_id)
+        if memo and memo[0] == generation and memo[1] <= now and (memo[2] is None or now <= memo[2]):
+            return memo[3]
+        
+        # Fenster noch offen: bis zu 1 Minute in der Vergangenheit zählt mit
+        since = _iso(now - window)
+        conn = get_db()
+        cursor = conn.cursor()
+        if user_id is None:
+            cursor.execute(NEXT_ALARM_SQL, (since,))
+            upcoming = cursor.fetchone()
+            cursor.execute(PASSED_ALARMS_SQL, (since,))
+        else:
+            cursor.execute(NEXT_USER_ALARM_SQL, (user_id, since))
+            upcoming = cursor.fetchone()
+            cursor.execute(PASSED_USER_ALARMS_SQL, (user_id, since))
+        stale_rows = cursor.fetchall()
+        conn.close()
+        
+        # Verpasste Vorkommen (noch nicht vom Scheduler weitergeschoben) nur im Speicher neu berechnen
+        candidates = [DBAlarm(upcoming)] if upcoming else []
+        for alarm in (DBAlarm(row) for row in stale_rows):
+            fire_at = alarm.next_trigger_time(now)
+            if fire_at:
+                alarm.next_fire_at = fire_at.replace(microsecond=0)
+                candidates.append(alarm)
+        alarm = min(candidates, key=lambda a: (a.next_fire_at, a.id)) if candidates else None
+        
+        with self._cache_lock:
+            if self._generation == generation:
+                self._next_memo[user_id] = (generation, now, alarm.next_fire_at + window if alarm else None, alarm)
+        return alarm
+    
     def snooze_alarm(self, alarm_id, minutes=None):
         """Snooze an alarm"""
         alarm = self.get_alarm(alarm_id)
@@ -247,22 +686,29 @@ class DBAlarmManager:
         cursor.execute('''
             UPDATE alarms SET snooze_until = ? WHERE id = ?
         ''', (snooze_until.isoformat(), alarm_id))
+        result = self._fetch_row(cursor, alarm_id)
         conn.commit()
         conn.close()
         
+        if result:
+            self._cache_store(result)
         return True
     
     def dismiss_alarm(self, alarm_id):
         """Dismiss an alarm"""
         conn = get_db()
         cursor = conn.cursor()
+        # Lokale Zeit wie snooze_until (CURRENT_TIMESTAMP wäre UTC)
         cursor.execute('''
             UPDATE alarms 
-            SET last_triggered = CURRENT_TIMESTAMP, snooze_until = NULL 
+            SET last_triggered = ?, snooze_until = NULL 
             WHERE id = ?
-        ''', (alarm_id,))
+        ''', (datetime.now().isoformat(), alarm_id))
         dismissed = cursor.rowcount > 0
+        result = self._fetch_row(cursor, alarm_id) if dismissed else None
         conn.commit()
         conn.close()
+        
+        if result:
+            self._cache_store(result)
         return dismissed
-
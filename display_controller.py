@@ -2,11 +2,11 @@
 TM1637 4-digit 7-segment display controller
 """
 import time
-import RPi.GPIO as GPIO
+from gpio_backend import get_gpio
 from config import TM1637_CLK_PIN, TM1637_DIO_PIN, DISPLAY_BRIGHTNESS
 
 # TM1637 Commands
-TM1637_CMD1 = 0x40  # Data command
+TM1637_CMD1 = 0x40  # Data command (auto-increment address)
 TM1637_CMD2 = 0xC0  # Address command
 TM1637_CMD3 = 0x80  # Display control
 TM1637_DSP_ON = 0x08  # Display on
@@ -21,16 +21,21 @@ DIGITS = {
 
 
 class TM1637Display:
-    def __init__(self, clk_pin=TM1637_CLK_PIN, dio_pin=TM1637_DIO_PIN):
+    def __init__(self, clk_pin=TM1637_CLK_PIN, dio_pin=TM1637_DIO_PIN, gpio=None):
+        self.gpio = gpio or get_gpio()
+        if self.gpio is None:
+            raise RuntimeError("No GPIO backend available")
         self.clk_pin = clk_pin
         self.dio_pin = dio_pin
         self.brightness = DISPLAY_BRIGHTNESS
+        self._frame = [None] * 4  # Zuletzt gesendete Segmente (None = unbekannt)
+        self._sent_brightness = None
         
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(self.clk_pin, GPIO.OUT)
-        GPIO.setup(self.dio_pin, GPIO.OUT)
-        GPIO.output(self.clk_pin, GPIO.HIGH)
-        GPIO.output(self.dio_pin, GPIO.HIGH)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setup(self.clk_pin, self.gpio.OUT)
+        self.gpio.setup(self.dio_pin, self.gpio.OUT)
+        self.gpio.output(self.clk_pin, self.gpio.HIGH)
+        self.gpio.output(self.dio_pin, self.gpio.HIGH)
         
         self._init_display()
     
@@ -40,57 +45,62 @@ class TM1637Display:
         self._write_byte(TM1637_CMD1)
         self._stop()
         
+        self._send_brightness()
+    
+    def _send_brightness(self):
+        """Send the display control command (brightness, display on)"""
         self._start()
-        self._write_byte(TM1637_CMD3 | DISPLAY_BRIGHTNESS | TM1637_DSP_ON)
+        self._write_byte(TM1637_CMD3 | self.brightness | TM1637_DSP_ON)
         self._stop()
+        self._sent_brightness = self.brightness
     
     def _start(self):
         """Start signal for I2C communication"""
-        GPIO.output(self.dio_pin, GPIO.LOW)
+        self.gpio.output(self.dio_pin, self.gpio.LOW)
         time.sleep(0.000002)
-        GPIO.output(self.clk_pin, GPIO.LOW)
+        self.gpio.output(self.clk_pin, self.gpio.LOW)
         time.sleep(0.000002)
     
     def _stop(self):
         """Stop signal for I2C communication"""
-        GPIO.output(self.clk_pin, GPIO.LOW)
+        self.gpio.output(self.clk_pin, self.gpio.LOW)
         time.sleep(0.000002)
-        GPIO.output(self.dio_pin, GPIO.LOW)
+        self.gpio.output(self.dio_pin, self.gpio.LOW)
         time.sleep(0.000002)
-        GPIO.output(self.clk_pin, GPIO.HIGH)
+        self.gpio.output(self.clk_pin, self.gpio.HIGH)
         time.sleep(0.000002)
-        GPIO.output(self.dio_pin, GPIO.HIGH)
+        self.gpio.output(self.dio_pin, self.gpio.HIGH)
         time.sleep(0.000002)
     
     def _write_byte(self, data):
         """Write a byte to the display"""
         for i in range(8):
-            GPIO.output(self.clk_pin, GPIO.LOW)
+            self.gpio.output(self.clk_pin, self.gpio.LOW)
             time.sleep(0.000002)
-            GPIO.output(self.dio_pin, GPIO.LOW if (data & 0x01) else GPIO.HIGH)
+            self.gpio.output(self.dio_pin, self.gpio.LOW if (data & 0x01) else self.gpio.HIGH)
             time.sleep(0.000002)
-            GPIO.output(self.clk_pin, GPIO.HIGH)
+            self.gpio.output(self.clk_pin, self.gpio.HIGH)
             time.sleep(0.000002)
             data >>= 1
         
         # Wait for ACK
-        GPIO.output(self.clk_pin, GPIO.LOW)
-        GPIO.output(self.dio_pin, GPIO.HIGH)
+        self.gpio.output(self.clk_pin, self.gpio.LOW)
+        self.gpio.output(self.dio_pin, self.gpio.HIGH)
         time.sleep(0.000002)
-        GPIO.output(self.clk_pin, GPIO.HIGH)
+        self.gpio.output(self.clk_pin, self.gpio.HIGH)
         time.sleep(0.000002)
-        GPIO.setup(self.dio_pin, GPIO.IN)
+        self.gpio.setup(self.dio_pin, self.gpio.IN)
         
-        ack = GPIO.input(self.dio_pin)
+        ack = self.gpio.input(self.dio_pin)
         if ack == 0:
-            GPIO.setup(self.dio_pin, GPIO.OUT)
-            GPIO.output(self.dio_pin, GPIO.LOW)
+            self.gpio.setup(self.dio_pin, self.gpio.OUT)
+            self.gpio.output(self.dio_pin, self.gpio.LOW)
         
-        GPIO.setup(self.dio_pin, GPIO.OUT)
+        self.gpio.setup(self.dio_pin, self.gpio.OUT)
         time.sleep(0.000002)
     
     def _write_data(self, addr, data):
-        """Write data to a specific address"""
+        """Write data to a specific address (single digit, prefer write_frame)"""
         self._start()
         self._write_byte(TM1637_CMD1)
         self._stop()
@@ -99,18 +109,47 @@ class TM1637Display:
         self._write_byte(TM1637_CMD2 | addr)
         self._write_byte(data)
         self._stop()
+        self._frame[addr] = data
         
-        self._start()
-        self._write_byte(TM1637_CMD3 | self.brightness | TM1637_DSP_ON)
-        self._stop()
+        self._send_brightness()
     
     def set_brightness(self, brightness):
         """Set display brightness (0-7)"""
         if 0 <= brightness <= 7:
             self.brightness = brightness
+            if self._sent_brightness != brightness:
+                self._send_brightness()
+    
+    def write_frame(self, segments, force=False):
+        """Write a 4-digit frame of segment bytes
+        
+        Only the changed digits are sent, in a single auto-increment
+        transaction; an unchanged frame costs no GPIO writes at all.
+        """
+        segments = (list(segments) + [0x00] * 4)[:4]
+        
+        if force:
+            changed = [0, 1, 2, 3]
+        else:
+            changed = [i for i in range(4) if self._frame[i] != segments[i]]
+        
+        if changed:
+            first, last = changed[0], changed[-1]
+            
+            self._start()
+            self._write_byte(TM1637_CMD1)
+            self._stop()
+            
             self._start()
-            self._write_byte(TM1637_CMD3 | self.brightness | TM1637_DSP_ON)
+            self._write_byte(TM1637_CMD2 | first)
+            for i in range(first, last + 1):
+                self._write_byte(segments[i])
             self._stop()
+            
+            self._frame[first:last + 1] = segments[first:last + 1]
+        
+        if force or self._sent_brightness != self.brightness:
+            self._send_brightness()
     
     def show_time(self, hours, minutes, colon=True):
         """Display time in HH:MM format"""
@@ -121,13 +160,12 @@ class TM1637Display:
         hours_str = f"{hours:02d}"
         minutes_str = f"{minutes:02d}"
         
-        # Display hours (digits 0 and 1)
-        self._write_data(0, DIGITS.get(hours_str[0], 0x00))
-        self._write_data(1, DIGITS.get(hours_str[1], 0x00) | (0x80 if colon else 0))
-        
-        # Display minutes (digits 2 and 3)
-        self._write_data(2, DIGITS.get(minutes_str[0], 0x00))
-        self._write_data(3, DIGITS.get(minutes_str[1], 0x00))
+        self.write_frame([
+            DIGITS.get(hours_str[0], 0x00),
+            DIGITS.get(hours_str[1], 0x00) | (0x80 if colon else 0),
+            DIGITS.get(minutes_str[0], 0x00),
+            DIGITS.get(minutes_str[1], 0x00)
+        ])
     
     def show_text(self, text):
         """Display text (up to 4 characters) or scroll if longer"""
@@ -146,20 +184,15 @@ class TM1637Display:
             
     def _show_fixed_text(self, text):
         """Helper to show exactly 4 chars"""
-        for i, char in enumerate(text):
-            if i < 4:
-                self._write_data(i, DIGITS.get(char, 0x00))
-        # Fill remaining digits with spaces
-        for i in range(len(text), 4):
-            self._write_data(i, DIGITS.get(' ', 0x00))
+        # Remaining digits are filled with spaces
+        self.write_frame([DIGITS.get(char, 0x00) for char in text[:4]])
     
     def clear(self):
         """Clear the display"""
-        for i in range(4):
-            self._write_data(i, DIGITS.get(' ', 0x00))
+        self.write_frame([DIGITS.get(' ', 0x00)] * 4)
     
     def cleanup(self):
         """Cleanup GPIO pins"""
         self.clear()
-        GPIO.cleanup([self.clk_pin, self.dio_pin])
+        self.gpio.cleanup([self.clk_pin, self.dio_pin])
 
@@ -0,0 +1,72 @@
+"""
+In-process publish/subscribe bus for pushing changes to web clients
+"""
+import json
+import queue
+from threading import Lock
+
+SUBSCRIBER_QUEUE_SIZE = 100  # Langsame Clients verlieren die ältesten Events
+
+
+class EventBus:
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.version = 0
+        self._subscribers = set()
+        self._lock = Lock()
+
+    def subscribe(self, max_subscribers=None):
+        """Register a new subscriber and return its message queue
+
+        Returns None if max_subscribers are already registered.
+        """
+        subscription = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if max_subscribers is not None and len(self._subscribers) >= max_subscribers:
+                return None
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscriber"""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event, data=None, user_id=None):
+        """Publish an event to all subscribers
+
+        user_id marks events that only the owner (and admins) may see;
+        None broadcasts to everyone. Returns the new bus version.
+        """
+        with self._lock:
+            self.version += 1
+            message = {
+                'id': self.version,
+                'event': event,
+                'data': data,
+                'user_id': user_id
+            }
+            for subscription in self._subscribers:
+                try:
+                    subscription.put_nowait(message)
+                except queue.Full:
+                    try:
+                        subscription.get_nowait()
+                        subscription.put_nowait(message)
+                    except (queue.Empty, queue.Full):
+                        pass
+            return self.version
+
+
+def format_sse(event, data, event_id=None):
+    """Format a message in text/event-stream syntax"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,205 @@
+"""
+GPIO backends: the real RPi.GPIO module or a simulated, recording one
+
+The simulated backend makes the display and button/sound code importable
+and measurable without a Raspberry Pi. With record=True it keeps the
+most recent pin, setup and PWM changes with a timestamp; it can inject
+button presses. The app-level backend (get_gpio) does not record.
+"""
+import threading
+import time
+from collections import deque
+from config import GPIO_BACKEND
+
+_backend = None
+MAX_RECORDED_EVENTS = 100000  # Älteste Einträge fallen heraus (Dauerbetrieb mit record=True)
+
+
+class SimulatedPWM:
+    def __init__(self, gpio, pin, frequency):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = 0
+        self.running = False
+        gpio._record('pwm_init', pin, frequency)
+
+    def start(self, duty_cycle):
+        self.running = True
+        self.duty_cycle = duty_cycle
+        self.gpio._record('pwm_start', self.pin, duty_cycle)
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+        self.gpio._record('pwm_frequency', self.pin, frequency)
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+        self.gpio._record('pwm_duty_cycle', self.pin, duty_cycle)
+
+    def stop(self):
+        self.running = False
+        self.gpio._record('pwm_stop', self.pin)
+
+
+class SimulatedGPIO:
+    """Drop-in replacement for the RPi.GPIO module that records every call"""
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, record=True, max_events=MAX_RECORDED_EVENTS):
+        self.record = record
+        self.events = deque(maxlen=max_events)  # (timestamp, kind, pin, value)
+        self.mode = None
+        self.pin_modes = {}
+        self.pin_levels = {}
+        self._callbacks = {}  # pin -> (edge, callback, bouncetime)
+        self._last_callback = {}
+        self._lock = threading.Lock()
+
+    def _record(self, kind, pin=None, value=None):
+        if self.record:
+            with self._lock:
+                self.events.append((time.perf_counter(), kind, pin, value))
+
+    # --- RPi.GPIO API ---
+    def setwarnings(self, flag):
+        pass
+
+    def setmode(self, mode):
+        self.mode = mode
+        self._record('setmode', None, mode)
+
+    def setup(self, channel, direction, pull_up_down=None, initial=None):
+        self.pin_modes[channel] = direction
+        if initial is not None:
+            self.pin_levels[channel] = initial
+        else:
+            self.pin_levels.setdefault(channel, self.HIGH if pull_up_down == self.PUD_UP else self.LOW)
+        self._record('setup', channel, direction)
+
+    def output(self, channel, value):
+        self._record('output', channel, value)
+        self.pin_levels[channel] = value
+
+    def input(self, channel):
+        self._record('input', channel)
+        return self.pin_levels.get(channel, self.LOW)
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        self._callbacks[channel] = (edge, callback, bouncetime)
+        self._record('add_event_detect', channel, edge)
+
+    def remove_event_detect(self, channel):
+        self._callbacks.pop(channel, None)
+        self._record('remove_event_detect', channel)
+
+    def PWM(self, channel, frequency):
+        return SimulatedPWM(self, channel, frequency)
+
+    def cleanup(self, channel=None):
+        channels = [channel] if isinstance(channel, int) else channel or list(self.pin_modes)
+        for pin in channels:
+            self.pin_modes.pop(pin, None)
+            self.pin_levels.pop(pin, None)
+            self._callbacks.pop(pin, None)
+        self._record('cleanup', None, channel)
+
+    # --- Simulation helpers ---
+    def set_input(self, channel, value):
+        """Drive an input pin and fire matching edge callbacks"""
+        old = self.pin_levels.get(channel, self.LOW)
+        self.pin_levels[channel] = value
+        self._record('input_change', channel, value)
+        if old == value or channel not in self._callbacks:
+            return
+
+        edge, callback, bouncetime = self._callbacks[channel]
+        rising = value == self.HIGH
+        if not callback or (edge == self.RISING and not rising) or (edge == self.FALLING and rising):
+            return
+
+        now = time.monotonic()
+        last = self._last_callback.get(channel)
+        if bouncetime and last is not None and (now - last) * 1000 < bouncetime:
+            return
+        self._last_callback[channel] = now
+        callback(channel)
+
+    def inject_button_press(self, channel, duration=0.05):
+        """Simulate a press (HIGH) and release (LOW) of a button module"""
+        self.set_input(channel, self.HIGH)
+        if duration:
+            time.sleep(duration)
+        self.set_input(channel, self.LOW)
+
+    def reset_events(self):
+        with self._lock:
+            self.events.clear()
+
+    def count(self, kind=None, pin=None):
+        """Count recorded events, optionally filtered by kind and pin"""
+        with self._lock:
+            return sum(1 for _, k, p, _ in self.events
+                       if (kind is None or k == kind) and (pin is None or p == pin))
+
+    def edge_count(self, pin=None):
+        """Count output calls that actually changed a pin level"""
+        levels = {}
+        edges = 0
+        with self._lock:
+            for _, kind, p, value in self.events:
+                if kind != 'output' or (pin is not None and p != pin):
+                    continue
+                if levels.get(p) is not None and levels[p] != value:
+                    edges += 1
+                levels[p] = value
+        return edges
+
+    def measure(self, func, *args, **kwargs):
+        """Run func and report its GPIO cost (calls, edges, wall time)"""
+        self.reset_events()
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        return {
+            'outputs': self.count('output'),
+            'edges': self.edge_count(),
+            'setups': self.count('setup'),
+            'inputs': self.count('input'),
+            'pwm_changes': sum(self.count(k) for k in ('pwm_start', 'pwm_frequency', 'pwm_duty_cycle', 'pwm_stop')),
+            'seconds': elapsed
+        }
+
+
+def get_gpio():
+    """Get the configured GPIO backend (None if RPi.GPIO is unavailable)"""
+    global _backend
+    if _backend is None:
+        if GPIO_BACKEND == 'sim':
+            # Im laufenden Betrieb nichts aufzeichnen (die Display-Schleife schreibt pausenlos)
+            _backend = SimulatedGPIO(record=False)
+        else:
+            try:
+                import RPi.GPIO as GPIO
+                _backend = GPIO
+            except (ImportError, RuntimeError) as e:
+                print(f"Warning: RPi.GPIO not available: {e}")
+                return None
+    return _backend
+
+
+def set_gpio(backend):
+    """Replace the GPIO backend (e.g. with a SimulatedGPIO for benchmarks)"""
+    global _backend
+    _backend = backend
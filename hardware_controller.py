@@ -1,58 +1,89 @@
 """
 Hardware controller for button and sound
 """
-import RPi.GPIO as GPIO
 import threading
 import time
 import os
-from config import BUTTON_PIN, SOUND_PIN
-
-try:
-    import pygame
-    PYGAME_AVAILABLE = True
-except ImportError:
-    PYGAME_AVAILABLE = False
+from config import (BUTTON_PIN, SOUND_PIN, ALARM_TONE_PATTERN, ALARM_TONE_FREQUENCY,
+                    ALARM_TONE_ESCALATION_SECONDS)
+from gpio_backend import get_gpio
+from sound_cache import SoundCache, init_mixer, load_pygame, mixer_ready
+from tone_engine import ToneEngine
 
 
 class HardwareController:
-    def __init__(self, button_callback=None):
+    def __init__(self, button_callback=None, gpio=None, audio_started_callback=None):
+        self.gpio = gpio or get_gpio()
         self.button_callback = button_callback
+        self.audio_started_callback = audio_started_callback  # Aufruf, sobald tatsächlich Ton ausgegeben wird
         self.sound_playing = False
         self.sound_thread = None
         self.alarm_active = False
         self.simulation_mode = False
+        self.sound_cache = SoundCache()
+        self.tone_engine = ToneEngine()
         
         try:
-            GPIO.setmode(GPIO.BCM)
+            if self.gpio is None:
+                raise RuntimeError("No GPIO backend available")
+            self.gpio.setmode(self.gpio.BCM)
             # Button-Modul hat High Level Output (HIGH wenn gedrückt)
             # Kein Pull-up nötig, da Modul bereits Logik hat
-            GPIO.setup(BUTTON_PIN, GPIO.IN)
+            self.gpio.setup(BUTTON_PIN, self.gpio.IN)
             
             # Setup button interrupt - RISING weil Modul HIGH ausgibt wenn gedrückt
-            GPIO.add_event_detect(BUTTON_PIN, GPIO.RISING, 
+            self.gpio.add_event_detect(BUTTON_PIN, self.gpio.RISING, 
                                  callback=self._button_pressed, 
                                  bouncetime=300)
             
             # Setup sound pin (PWM)
-            GPIO.setup(SOUND_PIN, GPIO.OUT)
-            self.pwm = GPIO.PWM(SOUND_PIN, 1000)  # 1kHz frequency
+            self.gpio.setup(SOUND_PIN, self.gpio.OUT)
+            self.pwm = self.gpio.PWM(SOUND_PIN, 1000)  # 1kHz frequency
             self.pwm.start(0)  # Start with 0% duty cycle (silent)
         except Exception as e:
             print(f"Hardware-Init-Fehler: {e} - Starte im Simulationsmodus")
             self.simulation_mode = True
-        
-        # Try to initialize pygame for better sound
-        if PYGAME_AVAILABLE:
-            try:
-                pygame.mixer.init(frequency=22050, size=-16, channels=2, buffer=512)
-            except:
-                pass
+    
+    def warm_up_audio(self):
+        """Import pygame, initialize the mixer and pre-render the alarm tone
+
+        Runs in the background after startup (start_background_workers), so
+        the web server does not wait for pygame/NumPy; returns False if
+        pygame is unavailable.
+        """
+        try:
+            if not init_mixer():
+                return False
+            # Standard-Alarmton vorab rendern, damit der Alarmstart nichts berechnen muss
+            self.tone_engine.render(ALARM_TONE_PATTERN, ALARM_TONE_FREQUENCY)
+            return True
+        except Exception as e:
+            print(f"Warning: Could not initialize pygame mixer: {e}")
+            return False
+    
+    def _mixer_available(self):
+        """Mixer ready for playback; initializes it here if the warm-up has not run yet"""
+        if mixer_ready():
+            return True
+        try:
+            return init_mixer()
+        except Exception as e:
+            print(f"Warning: Could not initialize pygame mixer: {e}")
+            return False
     
     def _button_pressed(self, channel):
         """Handle button press interrupt"""
         if self.button_callback:
             self.button_callback()
     
+    def _audio_started(self):
+        """Report the start of audio output (latency tracking)"""
+        if self.audio_started_callback:
+            try:
+                self.audio_started_callback()
+            except Exception as e:
+                print(f"Error in audio started callback: {e}")
+    
     def start_alarm_sound(self, frequency=1000, duration=None, sound_file=None):
         """Start playing alarm sound"""
         if self.sound_playing:
@@ -63,9 +94,17 @@ class HardwareController:
         
         # If custom sound file provided, try to play it
         if sound_file and os.path.exists(sound_file):
-            if PYGAME_AVAILABLE:
+            if self._mixer_available():
+                # Zu große Dateien nicht komplett dekodieren, sondern direkt streamen
+                if not self.sound_cache.is_oversized(sound_file):
+                    try:
+                        # Vorab dekodierter Sound aus dem Cache, Schleife im Mixer
+                        self.sound_cache.get(sound_file).play(loops=-1)
+                        self._audio_started()
+                        return
+                    except Exception as e:
+                        print(f"Error playing cached sound, streaming instead: {e}")
                 try:
-                    pygame.mixer.init()
                     self.sound_thread = threading.Thread(
                         target=self._play_custom_sound,
                         args=(sound_file,),
@@ -76,29 +115,29 @@ class HardwareController:
                 except Exception as e:
                     print(f"Error playing custom sound: {e}")
         
-        # Fallback to default sound
-        if PYGAME_AVAILABLE and pygame.mixer.get_init():
-            # Use pygame for better sound quality
-            self.sound_thread = threading.Thread(
-                target=self._play_pygame_sound,
-                daemon=True
-            )
-        else:
-            # Use PWM for simple beep
-            self.sound_thread = threading.Thread(
-                target=self._play_pwm_sound,
-                args=(frequency, duration),
-                daemon=True
-            )
+        # Fallback to default sound (pygame for better sound quality)
+        if self._mixer_available() and self._play_pygame_sound():
+            return
         
+        # Use PWM for simple beep
+        self.sound_thread = threading.Thread(
+            target=self._play_pwm_sound,
+            args=(frequency, duration),
+            daemon=True
+        )
         self.sound_thread.start()
     
     def _play_custom_sound(self, sound_file):
         """Play a custom sound file"""
         try:
+            pygame = load_pygame()
             pygame.mixer.music.load(sound_file)
+            started = False
             while self.alarm_active and self.sound_playing:
                 pygame.mixer.music.play()
+                if not started:
+                    started = True
+                    self._audio_started()
                 while pygame.mixer.music.get_busy() and self.alarm_active:
                     time.sleep(0.1)
                 if not self.alarm_active:
@@ -107,7 +146,8 @@ class HardwareController:
         except Exception as e:
             print(f"Error in custom sound playback: {e}")
             # Fallback to default
-            self._play_pygame_sound()
+            if not self._play_pygame_sound():
+                self._play_pwm_sound(800, None)
     
     def _play_pwm_sound(self, frequency, duration):
         """Play sound using PWM"""
@@ -116,6 +156,7 @@ class HardwareController:
 
         self.pwm.ChangeFrequency(frequency)
         self.pwm.ChangeDutyCycle(50)  # 50% duty cycle
+        self._audio_started()
         
         if duration:
             time.sleep(duration)
@@ -127,28 +168,35 @@ class HardwareController:
             self.stop_sound()
     
     def _play_pygame_sound(self):
-        """Play sound using pygame (if available)"""
+        """Loop the cached alarm tone in the mixer; returns False if pygame fails"""
         try:
-            # Generate a simple beep sound
-            import numpy as np
-            sample_rate = 22050
-            duration = 0.5  # 500ms beep
-            frequency = 800
-            
-            t = np.linspace(0, duration, int(sample_rate * duration))
-            wave = np.sin(2 * np.pi * frequency * t)
-            wave = (wave * 32767).astype(np.int16)
-            
-            sound = pygame.sndarray.make_sound(wave)
+            sound = self.tone_engine.render(ALARM_TONE_PATTERN, ALARM_TONE_FREQUENCY)
+            channel = sound.play(loops=-1)
+            if channel is None:
+                return False
+            self._audio_started()
             
-            while self.alarm_active and self.sound_playing:
-                sound.play()
-                time.sleep(0.5)  # Play beep every 500ms
-                if not self.alarm_active:
-                    break
-        except:
-            # Fallback to PWM if pygame fails
-            self._play_pwm_sound(800, None)
+            if ALARM_TONE_PATTERN == 'escalating':
+                channel.set_volume(0.2)
+                self.sound_thread = threading.Thread(
+                    target=self._escalate_volume,
+                    args=(channel,),
+                    daemon=True
+                )
+                self.sound_thread.start()
+            return True
+        except Exception as e:
+            print(f"Error playing alarm tone: {e}")
+            return False
+    
+    def _escalate_volume(self, channel, steps=8):
+        """Raise the channel volume in steps; the beat itself keeps looping in the mixer"""
+        interval = ALARM_TONE_ESCALATION_SECONDS / steps
+        for step in range(1, steps + 1):
+            time.sleep(interval)
+            if not self.alarm_active:
+                break
+            channel.set_volume(0.2 + 0.8 * step / steps)
     
     def stop_sound(self):
         """Stop playing alarm sound"""
@@ -161,9 +209,11 @@ class HardwareController:
             except:
                 pass
         
-        if PYGAME_AVAILABLE:
+        if mixer_ready():
+            pygame = load_pygame()
             try:
                 pygame.mixer.stop()
+                pygame.mixer.music.stop()
             except:
                 pass
     
@@ -172,15 +222,15 @@ class HardwareController:
         self.stop_sound()
         if not self.simulation_mode:
             try:
-                GPIO.remove_event_detect(BUTTON_PIN)
+                self.gpio.remove_event_detect(BUTTON_PIN)
                 self.pwm.stop()
-                GPIO.cleanup([BUTTON_PIN, SOUND_PIN])
+                self.gpio.cleanup([BUTTON_PIN, SOUND_PIN])
             except:
                 pass
         
-        if PYGAME_AVAILABLE:
+        if mixer_ready():
             try:
-                pygame.mixer.quit()
+                load_pygame().mixer.quit()
             except:
                 pass
 
@@ -0,0 +1,170 @@
+"""
+In-process metrics exposed in Prometheus text format (/api/metrics)
+
+Counters and histograms are kept in plain dicts behind one lock; gauges
+that describe current state (pool size, threads, RSS, ...) are read by
+callbacks when the endpoint is scraped.
+"""
+import os
+import re
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+
+# Sekunden; deckt schnelle SQLite-Queries bis langsame Requests ab
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE)\s+(\w+)', re.IGNORECASE)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Letzter Eintrag: +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types = {}  # name -> (type, help)
+        self._values = {}  # (name, labels) -> Zahl (counter/gauge) oder Histogram
+        self._callbacks = []  # (name, func) - func liefert Zahl oder [(labels, Zahl)]
+
+    def describe(self, name, kind, help_text):
+        """Declare a metric (kind: counter, gauge or histogram)"""
+        self._types[name] = (kind, help_text)
+
+    def inc(self, name, value=1, labels=()):
+        """Add to a counter (or a gauge tracked by deltas)"""
+        key = (name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def observe(self, name, value, labels=()):
+        """Record a histogram sample"""
+        key = (name, labels)
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = Histogram()
+            histogram.observe(value)
+
+    def callback(self, name, kind, help_text, func):
+        """Register a metric whose value is read from func() on every scrape"""
+        self.describe(name, kind, help_text)
+        self._callbacks.append((name, func))
+
+    def collect(self):
+        """Get {name: [(labels, value or Histogram)]} including callback metrics"""
+        samples = {}
+        with self._lock:
+            for (name, labels), value in self._values.items():
+                if isinstance(value, Histogram):
+                    copy = Histogram(value.buckets)
+                    copy.counts, copy.sum, copy.count = list(value.counts), value.sum, value.count
+                    value = copy
+                samples.setdefault(name, []).append((labels, value))
+
+        for name, func in self._callbacks:
+            try:
+                value = func()
+            except Exception as e:
+                print(f"Metric {name} failed: {e}")
+                continue
+            if value is None:
+                continue
+            samples[name] = value if isinstance(value, list) else [((), value)]
+        return samples
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, series in sorted(self.collect().items()):
+            kind, help_text = self._types.get(name, ('untyped', ''))
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(series, key=lambda item: item[0]):
+                if not isinstance(value, Histogram):
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(value.buckets + (float('inf'),), value.counts):
+                    cumulative += count
+                    bucket_labels = labels + (('le', _format_value(bound)),)
+                    lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value.sum)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {value.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+registry.describe('wecker_http_requests_total', 'counter', 'HTTP requests by route, method and status')
+registry.describe('wecker_http_request_duration_seconds', 'histogram', 'HTTP request latency by route')
+registry.describe('wecker_db_query_duration_seconds', 'histogram', 'SQLite statement latency by statement and table')
+registry.describe('wecker_db_connections_opened_total', 'counter', 'SQLite connections opened (pool misses)')
+registry.describe('wecker_db_checkouts_total', 'counter', 'Connections handed out by get_db')
+registry.describe('wecker_db_connections_in_use', 'gauge', 'Connections currently checked out of the pool')
+registry.describe('wecker_loop_iteration_seconds', 'histogram', 'Work time per background loop iteration')
+registry.describe('wecker_loop_drift_seconds', 'histogram', 'How late a background loop woke up')
+
+
+@lru_cache(maxsize=512)
+def statement_label(sql):
+    """'SELECT * FROM alarms WHERE ...' -> 'SELECT alarms' (bounded label cardinality)"""
+    words = sql.split(None, 1)
+    verb = words[0].upper() if words else ''
+    match = _TABLE_PATTERN.search(sql)
+    return f'{verb} {match.group(1)}' if match else verb
+
+
+def observe_request(route, method, status, seconds):
+    registry.inc('wecker_http_requests_total', labels=(('route', route), ('method', method), ('status', str(status))))
+    registry.observe('wecker_http_request_duration_seconds', seconds, labels=(('route', route), ('method', method)))
+
+
+def observe_query(sql, seconds):
+    registry.observe('wecker_db_query_duration_seconds', seconds, labels=(('statement', statement_label(sql)),))
+
+
+def observe_loop(loop, seconds, drift=None):
+    """Record one background loop iteration (drift: seconds later than planned)"""
+    registry.observe('wecker_loop_iteration_seconds', seconds, labels=(('loop', loop),))
+    if drift is not None:
+        registry.observe('wecker_loop_drift_seconds', max(drift, 0.0), labels=(('loop', loop),))
+
+
+def resident_memory_bytes():
+    """Current RSS from /proc (Linux); None elsewhere"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+registry.callback('wecker_threads', 'gauge', 'Active Python threads', threading.active_count)
+registry.callback('wecker_process_resident_memory_bytes', 'gauge', 'Resident set size of the process',
+                  resident_memory_bytes)
@@ -0,0 +1,356 @@
+"""
+Versioned schema migrations
+
+Each migration runs once, in order, inside its own transaction and is
+recorded in the schema_version table. Migrations must be idempotent
+(CREATE ... IF NOT EXISTS, add_column) so that databases created before
+the migration framework existed upgrade cleanly.
+"""
+
+
+def add_column(cursor, table, column, definition):
+    """Add a column unless it already exists"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def _initial_schema(cursor):
+    # Users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP
+        )
+    ''')
+
+    # Alarms table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alarms (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            time TEXT NOT NULL,
+            days TEXT,
+            enabled INTEGER DEFAULT 1,
+            label TEXT,
+            sound_file TEXT,
+            snooze_allowed INTEGER DEFAULT 1,
+            snooze_duration INTEGER DEFAULT 5,
+            snooze_until TIMESTAMP,
+            last_triggered TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
+
+    # Settings table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Sounds table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sounds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            original_filename TEXT NOT NULL,
+            user_id INTEGER,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
+
+    # Sessions table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    ''')
+
+
+def _hot_query_indexes(cursor):
+    # get_user_alarms: WHERE user_id = ? ORDER BY time
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alarms_user_time ON alarms(user_id, time, id)')
+    # check_alarms: WHERE enabled = 1
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alarms_enabled_time ON alarms(enabled, time)')
+    # get_all_alarms: ORDER BY time
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alarms_time ON alarms(time, id)')
+    # get_user_sounds / get_all_sounds: ORDER BY uploaded_at DESC
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sounds_user_uploaded ON sounds(user_id, uploaded_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sounds_uploaded ON sounds(uploaded_at)')
+    # cleanup_expired_sessions: WHERE expires_at < CURRENT_TIMESTAMP
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)')
+
+
+def _sound_processing(cursor):
+    # Status der Hintergrund-Normalisierung (audio_pipeline)
+    add_column(cursor, 'sounds', 'processing_status', "TEXT NOT NULL DEFAULT 'pending'")
+    add_column(cursor, 'sounds', 'processed_filename', 'TEXT')
+    add_column(cursor, 'sounds', 'processing_error', 'TEXT')
+
+
+def _content_addressed_sounds(cursor):
+    # Dateien heißen <sha256>.<ext>; mehrere Zeilen können auf dieselbe Datei zeigen
+    add_column(cursor, 'sounds', 'content_hash', 'TEXT')
+    add_column(cursor, 'sounds', 'size', 'INTEGER')
+    # Referenzzählung beim Upload/Löschen: WHERE filename = ?
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sounds_filename ON sounds(filename)')
+
+
+def _sound_analysis(cursor):
+    # Dauer/Format und Min/Max-Peaks (int8-Paare) aus der Hintergrundverarbeitung
+    add_column(cursor, 'sounds', 'duration_ms', 'INTEGER')
+    add_column(cursor, 'sounds', 'sample_rate', 'INTEGER')
+    add_column(cursor, 'sounds', 'channels', 'INTEGER')
+    add_column(cursor, 'sounds', 'peaks', 'BLOB')
+
+
+def _parse_timestamp(value):
+    """Parse a stored ISO timestamp (None if missing or invalid)"""
+    from datetime import datetime
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _first_fire(row, now):
+    """Next occurrence of a stored alarm row, without the application classes
+
+    Returns None for disabled rows and rows whose time or days cannot be
+    parsed; next_fire_at stays NULL for those.
+    """
+    from datetime import datetime, time, timedelta
+    import json
+
+    if not row['enabled']:
+        return None
+    window = timedelta(seconds=60)
+    snooze_until = _parse_timestamp(row['snooze_until'])
+    if snooze_until and snooze_until + window >= now:
+        return snooze_until
+
+    try:
+        hour, minute = map(int, row['time'].split(':'))
+        alarm_time = time(hour, minute)
+        days = json.loads(row['days']) if row['days'] else list(range(7))
+        days = {day for day in days if isinstance(day, int)}
+    except (AttributeError, TypeError, ValueError):
+        return None
+    last_triggered = _parse_timestamp(row['last_triggered'])
+
+    for offset in range(8):
+        day = now.date() + timedelta(days=offset)
+        candidate = datetime.combine(day, alarm_time)
+        if candidate + window < now or candidate.weekday() not in days:
+            continue
+        if last_triggered and last_triggered.date() == day:
+            continue
+        return candidate
+    return None
+
+
+def _alarm_next_fire(cursor):
+    # Gespeichertes nächstes Vorkommen für die Fälligkeitsabfrage (DBAlarmManager.due_alarms);
+    # bewusst ohne db_alarm_manager, damit spätere Änderungen dort die Migration nicht verändern
+    from datetime import datetime
+
+    add_column(cursor, 'alarms', 'next_fire_at', 'TEXT')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alarms_next_fire ON alarms(next_fire_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alarms_user_next_fire ON alarms(user_id, next_fire_at)')
+
+    # Bestehende Alarme nachtragen (nicht lesbare Zeilen bleiben NULL)
+    now = datetime.now()
+    cursor.execute('SELECT id, time, days, enabled, snooze_until, last_triggered FROM alarms')
+    values = []
+    for row in cursor.fetchall():
+        fire_at = _first_fire(row, now)
+        values.append((fire_at.replace(microsecond=0).isoformat() if fire_at else None, row['id']))
+    cursor.executemany('UPDATE alarms SET next_fire_at = ? WHERE id = ?', values)
+
+
+def _alarm_events(cursor):
+    # Append-only Historie der Auslösungen (Latenzen ab Fälligkeit) und Snooze/Dismiss (alarm_events.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alarm_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            alarm_id INTEGER NOT NULL,
+            user_id INTEGER,
+            event TEXT NOT NULL,
+            source TEXT NOT NULL,
+            due_at TEXT,
+            noticed_at TEXT,
+            sound_started_at TEXT,
+            audio_started_at TEXT,
+            notice_ms REAL,
+            sound_ms REAL,
+            audio_ms REAL,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    # latency_stats: WHERE event = ? AND created_at >= ?
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alarm_events_event_created ON alarm_events(event, created_at)')
+    # recent: WHERE user_id = ? ORDER BY id DESC
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alarm_events_user ON alarm_events(user_id, id)')
+
+
+def _alarm_change_counter(cursor):
+    # Zählt jede Änderung an alarms (auch durch andere Verbindungen); PRAGMA data_version
+    # ändert sich dagegen bei Commits auf jede Tabelle (Sessions, Sounds, alarm_events, ...)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alarm_changes (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO alarm_changes (id, version) VALUES (1, 0)')
+    for operation in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS alarms_changed_{operation.lower()} AFTER {operation} ON alarms
+            BEGIN
+                UPDATE alarm_changes SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+
+# (version, description, function) - nur anhängen, nie umsortieren oder ändern
+SCHEMA_MIGRATIONS = [
+    (1, 'Initial schema', _initial_schema),
+    (2, 'Secondary indexes for hot queries', _hot_query_indexes),
+    (3, 'Sound processing status', _sound_processing),
+    (4, 'Content-addressed sound storage', _content_addressed_sounds),
+    (5, 'Sound duration and waveform peaks', _sound_analysis),
+    (6, 'Stored next alarm occurrence', _alarm_next_fire),
+    (7, 'Alarm event history', _alarm_events),
+    (8, 'Alarm change counter', _alarm_change_counter),
+]
+
+
+def get_schema_version(conn):
+    """Get the highest applied migration version (0 for a fresh database)"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'
+    ''')
+    if not cursor.fetchone():
+        return 0
+    cursor.execute('SELECT MAX(version) FROM schema_version')
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(conn):
+    """Apply all pending migrations, each in its own transaction"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+    current = get_schema_version(conn)
+    applied = []
+    for version, description, migration in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            # Parallel gestarteter Prozess könnte schneller gewesen sein
+            cursor.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,))
+            if cursor.fetchone():
+                conn.rollback()
+                continue
+            migration(cursor)
+            cursor.execute('''
+                INSERT INTO schema_version (version, description) VALUES (?, ?)
+            ''', (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"Database migrated to schema version {version}: {description}")
+
+    return applied
+
+
+# Hot queries of the other modules and the index each must use (checked with EXPLAIN QUERY PLAN)
+HOT_QUERIES = [
+    ('get_user_sounds', 'SELECT * FROM sounds WHERE user_id = ? ORDER BY uploaded_at DESC', (1,),
+     'idx_sounds_user_uploaded'),
+    ('get_all_sounds', 'SELECT * FROM sounds ORDER BY uploaded_at DESC', (),
+     'idx_sounds_uploaded'),
+    ('sound_references', 'SELECT COUNT(*) FROM sounds WHERE filename = ?', ('x.wav',),
+     'idx_sounds_filename'),
+    ('alarm_latency_stats',
+     'SELECT notice_ms, sound_ms, audio_ms FROM alarm_events WHERE event = ? AND created_at >= ?',
+     ('triggered', '2026-01-01T00:00:00'), 'idx_alarm_events_event_created'),
+    ('recent_user_alarm_events', 'SELECT * FROM alarm_events WHERE user_id = ? ORDER BY id DESC LIMIT ?',
+     (1, 50), 'idx_alarm_events_user'),
+    ('cleanup_expired_sessions', 'DELETE FROM sessions WHERE expires_at < CURRENT_TIMESTAMP', (),
+     'idx_sessions_expires'),
+]
+
+
+def hot_queries():
+    """Get HOT_QUERIES plus the alarm queries, built from the SQL DBAlarmManager runs"""
+    # Erst hier importieren: db_alarm_manager -> database -> migrations
+    import db_alarm_manager as alarms
+
+    after = ('07:00', 1)
+    since = ('2026-01-01T07:00:00',)
+    return [
+        ('query_alarms', *alarms.alarm_query_sql(after=after), 'idx_alarms_time'),
+        ('query_alarms_enabled', *alarms.alarm_query_sql(enabled=True, after=after), 'idx_alarms_enabled_time'),
+        ('query_alarms_weekday', *alarms.alarm_query_sql(weekday=2, after=after), 'idx_alarms_time'),
+        ('query_alarms_label', *alarms.alarm_query_sql(label_prefix='Wake'), 'idx_alarms_time'),
+        ('query_alarms_time_range',
+         *alarms.alarm_query_sql(time_from='06:00', time_to='09:00'), 'idx_alarms_time'),
+        ('query_user_alarms', *alarms.alarm_query_sql(user_id=1, after=after), 'idx_alarms_user_time'),
+        ('query_user_alarms_filtered',
+         *alarms.alarm_query_sql(user_id=1, enabled=True, weekday=2, time_from='06:00', time_to='09:00',
+                                 label_prefix='Wake', after=after), 'idx_alarms_user_time'),
+        ('due_alarms', alarms.DUE_ALARMS_SQL, since, 'idx_alarms_next_fire'),
+        ('stale_next_fire', alarms.STALE_NEXT_FIRE_SQL, since, 'idx_alarms_next_fire'),
+        ('fire_times', alarms.FIRE_TIMES_SQL, (), 'idx_alarms_next_fire'),
+        ('next_alarm', alarms.NEXT_ALARM_SQL, since, 'idx_alarms_next_fire'),
+        ('next_user_alarm', alarms.NEXT_USER_ALARM_SQL, (1,) + since, 'idx_alarms_user_next_fire'),
+        ('passed_alarms', alarms.PASSED_ALARMS_SQL, since, 'idx_alarms_next_fire'),
+        ('passed_user_alarms', alarms.PASSED_USER_ALARMS_SQL, (1,) + since, 'idx_alarms_user_next_fire'),
+    ] + HOT_QUERIES
+
+
+def check_query_plans(conn, queries=None):
+    """Run EXPLAIN QUERY PLAN for the hot queries
+
+    Returns a list of dicts with name, expected index, plan text and
+    whether the plan uses the expected index.
+    """
+    results = []
+    for name, sql, params, index in queries or hot_queries():
+        cursor = conn.cursor()
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        plan = ' | '.join(row[3] for row in cursor.fetchall())
+        results.append({
+            'name': name,
+            'index': index,
+            'plan': plan,
+            'uses_index': index in plan
+        })
+    return results
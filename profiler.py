@@ -0,0 +1,196 @@
+"""
+Opt-in profiler for live requests and background loops
+
+An admin starts a profiling session with a sample rate for requests
+and/or a route that is always profiled, plus a number of iterations of
+check_alarms_loop and update_display_loop. Each profiled unit runs under
+cProfile; results are merged per target ("GET /api/alarms",
+"loop:check_alarms", ...) into pstats data. While a unit runs, a sampler
+thread records its stack every few milliseconds as folded stacks for
+flame graphs. When no session is active the hooks only check a flag.
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from config import PROFILER_SAMPLE_INTERVAL_MS
+
+PSTATS_SORT_KEYS = ('cumulative', 'tottime', 'calls', 'name')
+
+
+class ProfileSession:
+    __slots__ = ('target', 'profile', 'thread_id', 'finished')
+
+    def __init__(self, target):
+        self.target = target
+        self.profile = cProfile.Profile()
+        self.thread_id = threading.get_ident()
+        self.finished = False
+
+
+def fold_stack(frame):
+    """Frame -> 'outer;...;inner' with 'function (file:line)' entries"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Profiler:
+    def __init__(self, sample_interval=PROFILER_SAMPLE_INTERVAL_MS / 1000):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.route = None
+        self.max_requests = None
+        self.sample_interval = sample_interval
+        self.started_at = None
+        self._loop_budget = {}  # Schleifenname -> verbleibende Iterationen
+        self._requests_profiled = 0
+        self._active = None  # Laufende ProfileSession (immer nur eine, cProfile ist prozessweit heikel)
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {}  # target -> pstats.Stats
+        self._folded = {}  # target -> Counter(folded stack -> samples)
+        self._units = Counter()  # target -> Anzahl profilierter Requests/Iterationen
+        self._sampler = None
+
+    def start(self, sample_rate=0.0, route=None, loop_iterations=0, max_requests=None):
+        """Start a new session (previous results are discarded)"""
+        with self._lock:
+            self._stats.clear()
+            self._folded.clear()
+            self._units.clear()
+        self.sample_rate = sample_rate
+        self.route = route
+        self.max_requests = max_requests
+        self._requests_profiled = 0
+        self._loop_budget = {'check_alarms': loop_iterations, 'update_display': loop_iterations}
+        self.started_at = time.time()
+        self.enabled = True
+
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        """End the session; collected results stay available"""
+        self.enabled = False
+        self._loop_budget = {}
+
+    def begin_request(self, rule, method):
+        """Start profiling a request if it is sampled (returns a session or None)"""
+        if not self.enabled or (self.max_requests is not None and self._requests_profiled >= self.max_requests):
+            return None
+        if not ((self.route and rule == self.route) or (self.sample_rate and random.random() < self.sample_rate)):
+            return None
+        session = self._begin(f'{method} {rule or "unmatched"}')
+        if session:
+            self._requests_profiled += 1
+        return session
+
+    def begin_loop(self, name):
+        """Start profiling one loop iteration while the loop has budget left"""
+        budget = self._loop_budget
+        if not budget.get(name):
+            return None
+        session = self._begin(f'loop:{name}')
+        if session:
+            budget[name] -= 1
+        return session
+
+    def _begin(self, target):
+        # Nur eine Einheit gleichzeitig; parallele Requests werden dann einfach nicht profiliert
+        if not self._busy.acquire(blocking=False):
+            return None
+        session = ProfileSession(target)
+        self._active = session
+        session.profile.enable()
+        return session
+
+    def end(self, session):
+        """Stop a session returned by begin_*(); safe to call twice or with None"""
+        if session is None or session.finished:
+            return
+        session.profile.disable()
+        session.finished = True
+        self._active = None
+        self._busy.release()
+
+        stats = pstats.Stats(session.profile)
+        with self._lock:
+            if session.target in self._stats:
+                self._stats[session.target].add(stats)
+            else:
+                self._stats[session.target] = stats
+            self._units[session.target] += 1
+
+    def _sample_loop(self):
+        """Record the stack of the profiled unit every sample_interval seconds"""
+        while self.enabled:
+            time.sleep(self.sample_interval)
+            session = self._active
+            if session is None:
+                continue
+            frame = sys._current_frames().get(session.thread_id)
+            if frame is None:
+                continue
+            stack = fold_stack(frame)
+            with self._lock:
+                self._folded.setdefault(session.target, Counter())[stack] += 1
+
+    def status(self):
+        with self._lock:
+            targets = {target: {'units': count, 'samples': sum(self._folded.get(target, {}).values())}
+                       for target, count in self._units.items()}
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'route': self.route,
+            'max_requests': self.max_requests,
+            'requests_profiled': self._requests_profiled,
+            'loop_iterations_left': dict(self._loop_budget),
+            'started_at': self.started_at,
+            'targets': targets
+        }
+
+    def _merged_stats(self, target=None):
+        with self._lock:
+            selected = [stats for name, stats in self._stats.items() if target in (None, name)]
+            if not selected:
+                return None
+            merged = pstats.Stats()
+            for stats in selected:
+                merged.add(stats)
+        return merged
+
+    def pstats_dump(self, target=None):
+        """Binary pstats data (same format as Profile.dump_stats, for pstats/snakeviz)"""
+        stats = self._merged_stats(target)
+        return marshal.dumps(stats.stats) if stats else None
+
+    def text_report(self, target=None, sort='cumulative', limit=40):
+        stats = self._merged_stats(target)
+        if stats is None:
+            return None
+        stream = io.StringIO()
+        stats.stream = stream
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+    def folded(self, target=None):
+        """Folded stacks ('a;b;c count' per line) for flamegraph.pl / speedscope"""
+        with self._lock:
+            lines = []
+            for name, stacks in sorted(self._folded.items()):
+                if target in (None, name):
+                    prefix = '' if target else f'{name};'
+                    lines.extend(f'{prefix}{stack} {count}' for stack, count in stacks.most_common())
+        return '\n'.join(lines) + '\n' if lines else None
@@ -0,0 +1,153 @@
+"""
+Decoded sound cache for instant alarm start
+
+Sound files are decoded into PCM (pygame Sound objects) ahead of time and
+kept in memory under a byte budget with LRU eviction, so starting an
+alarm never waits on the SD card or on an MP3/OGG/FLAC decoder.
+"""
+import os
+import queue
+import threading
+from collections import OrderedDict
+from config import MIXER_FREQUENCY, MIXER_SIZE, MIXER_CHANNELS, MIXER_BUFFER, SOUND_CACHE_MAX_BYTES
+
+_pygame = None  # Wird erst beim ersten Audio-Zugriff importiert (dauert auf dem Pi Zero Sekunden)
+_pygame_lock = threading.Lock()
+
+
+def load_pygame():
+    """Import pygame on first use; returns the module or None if it is not installed"""
+    global _pygame
+    if _pygame is None:
+        with _pygame_lock:
+            if _pygame is None:
+                try:
+                    import pygame
+                    _pygame = pygame
+                except ImportError:
+                    _pygame = False
+    return _pygame or None
+
+
+def mixer_ready():
+    """True if the mixer is initialized (never triggers the pygame import itself)"""
+    return bool(_pygame) and bool(_pygame.mixer.get_init())
+
+
+def init_mixer():
+    """Initialize the pygame mixer once with the configured format"""
+    pygame = load_pygame()
+    if pygame is None:
+        return False
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(frequency=MIXER_FREQUENCY, size=MIXER_SIZE,
+                          channels=MIXER_CHANNELS, buffer=MIXER_BUFFER)
+    return True
+
+
+class SoundCache:
+    def __init__(self, max_bytes=SOUND_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # path -> (mtime, Sound, nbytes)
+        self._oversized = {}  # path -> mtime der Dateien, die dekodiert größer als max_bytes sind
+        self._lock = threading.Lock()
+        self._preload_queue = None
+
+    def _sound_bytes(self, sound):
+        frequency, size, channels = _pygame.mixer.get_init()
+        return int(sound.get_length() * frequency) * channels * (abs(size) // 8)
+
+    def get(self, path):
+        """Get a decoded Sound for a file, decoding it on a cache miss
+
+        Raises pygame.error if the file cannot be decoded.
+        """
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == mtime:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Dekodieren außerhalb des Locks (kann auf dem Pi Zero Sekunden dauern)
+        sound = load_pygame().mixer.Sound(path)
+        nbytes = self._sound_bytes(sound)
+
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old:
+                self.total_bytes -= old[2]
+            if nbytes > self.max_bytes:
+                # Nicht cachebar: beim Vorladen nicht jedes Mal erneut dekodieren
+                self._oversized[path] = mtime
+            else:
+                self._oversized.pop(path, None)
+                self._entries[path] = (mtime, sound, nbytes)
+                self.total_bytes += nbytes
+                while self.total_bytes > self.max_bytes:
+                    _, (_, _, evicted) = self._entries.popitem(last=False)
+                    self.total_bytes -= evicted
+        return sound
+
+    def contains(self, path):
+        with self._lock:
+            return path in self._entries
+    
+    def is_oversized(self, path):
+        """True if the file (unchanged since) decoded to more than max_bytes"""
+        with self._lock:
+            mtime = self._oversized.get(path)
+        if mtime is None:
+            return False
+        try:
+            return os.path.getmtime(path) == mtime
+        except OSError:
+            return False
+
+    def discard(self, path):
+        """Drop a file from the cache (e.g. after it was deleted)"""
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry:
+                self.total_bytes -= entry[2]
+            self._oversized.pop(path, None)
+
+    def preload(self, paths):
+        """Decode files in a background thread if they are not cached yet"""
+        if not mixer_ready():
+            return
+        missing = [p for p in paths if p and not self.contains(p) and not self.is_oversized(p)]
+        if not missing:
+            return
+
+        with self._lock:
+            if self._preload_queue is None:
+                self._preload_queue = queue.Queue()
+                threading.Thread(target=self._preload_worker, daemon=True).start()
+        for path in missing:
+            self._preload_queue.put(path)
+
+    def _preload_worker(self):
+        while True:
+            path = self._preload_queue.get()
+            try:
+                if not self.contains(path) and not self.is_oversized(path) and os.path.exists(path):
+                    self.get(path)
+            except Exception as e:
+                print(f"Error preloading sound {path}: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'oversized': len(self._oversized),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -1,10 +1,17 @@
 """
 Sound file management and playback
 """
+import hashlib
 import os
 import shutil
-from datetime import datetime
+import tempfile
+import threading
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from config import MAX_SOUND_UPLOAD_BYTES
 from database import get_db
+from audio_pipeline import (AudioPipeline, render_preview, PROCESSED_SUFFIX, PREVIEW_SUFFIX,
+                            STATUS_PENDING, STATUS_READY)
 
 SOUNDS_DIR = 'sounds'
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'ogg', 'flac'}
@@ -22,42 +29,131 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+class HashingUpload:
+    """Temporary upload file that hashes and size-checks data while it is written
+
+    Used as the stream factory for file uploads, so the size limit aborts
+    the request as soon as it is exceeded and the SHA-256 digest is ready
+    when parsing ends. Unless committed, the temporary file is removed on
+    close.
+    """
+    _file = None
+
+    def __init__(self, max_bytes=MAX_SOUND_UPLOAD_BYTES, directory=SOUNDS_DIR):
+        init_sounds_directory()
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.committed = False
+        self._hash = hashlib.sha256()
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        self._file = os.fdopen(fd, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.close()
+            raise RequestEntityTooLarge(f"File too large. Maximum size: {self.max_bytes // (1024 * 1024)}MB")
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def commit(self, filepath):
+        """Move the upload to its final path (dropped if that content already exists)"""
+        self._file.close()
+        if os.path.exists(filepath):
+            os.remove(self.path)
+        else:
+            os.replace(self.path, filepath)
+        self.committed = True
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def playback_filename(row):
+    """Get the file to play for a sound row (normalized rendition if ready)"""
+    if row['processing_status'] == STATUS_READY and row['processed_filename']:
+        return row['processed_filename']
+    return row['filename']
+
+
 class SoundManager:
     def __init__(self):
         init_sounds_directory()
         from database import init_database
         init_database()
+        self.pipeline = AudioPipeline(SOUNDS_DIR)
+        # Schützt Datei + Referenzzählung zwischen Upload und Löschen
+        self._blob_lock = threading.Lock()
+        self._preview_lock = threading.Lock()
     
     def upload_sound(self, file, user_id, original_filename):
-        """Upload and save a sound file"""
+        """Store an uploaded sound under its content hash
+
+        Identical files share one blob on disk; each upload gets its own
+        row referencing it.
+        """
         if not allowed_file(original_filename):
             raise ValueError(f"File type not allowed. Allowed: {', '.join(ALLOWED_EXTENSIONS)}")
         
-        # Generate unique filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        upload = file.stream if isinstance(file.stream, HashingUpload) else None
+        if upload is None:
+            # Nicht über UploadRequest gestreamt: blockweise kopieren und hashen
+            upload = HashingUpload()
+            try:
+                shutil.copyfileobj(file.stream, upload)
+            except Exception:
+                upload.close()
+                raise
+        
+        digest = upload.hexdigest()
         ext = original_filename.rsplit('.', 1)[1].lower()
-        filename = f"{timestamp}_{user_id}.{ext}"
+        filename = f"{digest}.{ext}"
         filepath = os.path.join(SOUNDS_DIR, filename)
         
-        # Save file
-        file.save(filepath)
+        with self._blob_lock:
+            upload.commit(filepath)
+            
+            conn = get_db()
+            cursor = conn.cursor()
+            # Bereits normalisierte Kopie desselben Inhalts wiederverwenden
+            cursor.execute('''
+                SELECT processed_filename, duration_ms, sample_rate, channels, peaks FROM sounds
+                WHERE filename = ? AND processing_status = ? LIMIT 1
+            ''', (filename, STATUS_READY))
+            existing = cursor.fetchone()
+            status = STATUS_READY if existing else STATUS_PENDING
+            copied = tuple(existing) if existing else (None,) * 5
+            cursor.execute('''
+                INSERT INTO sounds (filename, original_filename, user_id, content_hash, size,
+                                    processing_status, processed_filename,
+                                    duration_ms, sample_rate, channels, peaks)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (filename, original_filename, user_id, digest, upload.size, status) + copied)
+            sound_id = cursor.lastrowid
+            conn.commit()
+            conn.close()
         
-        # Save to database
-        conn = get_db()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO sounds (filename, original_filename, user_id)
-            VALUES (?, ?, ?)
-        ''', (filename, original_filename, user_id))
-        sound_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        # Normalisierung im Hintergrund, Upload-Request wartet nicht darauf
+        if status == STATUS_PENDING:
+            self.pipeline.submit(sound_id)
         
         return {
             'id': sound_id,
             'filename': filename,
             'original_filename': original_filename,
-            'filepath': filepath
+            'filepath': filepath,
+            'content_hash': digest,
+            'size': upload.size,
+            'processing_status': status
         }
     
     def get_sound(self, sound_id):
@@ -73,10 +169,74 @@ class SoundManager:
                 'id': row['id'],
                 'filename': row['filename'],
                 'original_filename': row['original_filename'],
-                'filepath': os.path.join(SOUNDS_DIR, row['filename'])
+                'filepath': os.path.join(SOUNDS_DIR, row['filename']),
+                'playback_filepath': os.path.join(SOUNDS_DIR, playback_filename(row)),
+                'content_hash': row['content_hash'],
+                'size': row['size'],
+                'duration_ms': row['duration_ms'],
+                'processing_status': row['processing_status'],
+                'processing_error': row['processing_error']
             }
         return None
     
+    def get_peaks(self, sound_id):
+        """Get format info and the raw min/max int8 peak pairs of a sound"""
+        conn = get_db()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, user_id, content_hash, processing_status,
+                   duration_ms, sample_rate, channels, peaks
+            FROM sounds WHERE id = ?
+        ''', (sound_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row:
+            return {
+                'id': row['id'],
+                'user_id': row['user_id'],
+                'content_hash': row['content_hash'],
+                'processing_status': row['processing_status'],
+                'duration_ms': row['duration_ms'],
+                'sample_rate': row['sample_rate'],
+                'channels': row['channels'],
+                'peaks': bytes(row['peaks']) if row['peaks'] is not None else None
+            }
+        return None
+    
+    def get_preview(self, filename):
+        """Get the name of a sound file's low-bitrate preview, rendering it once
+
+        Returns None if the file is not an uploaded original or no preview
+        can be rendered (e.g. pygame unavailable).
+        """
+        if secure_filename(filename) != filename or not allowed_file(filename):
+            return None
+        base = filename.rsplit('.', 1)[0]
+        if filename.endswith((PROCESSED_SUFFIX, PREVIEW_SUFFIX)):
+            return None
+        
+        preview = base + PREVIEW_SUFFIX
+        preview_path = os.path.join(SOUNDS_DIR, preview)
+        if os.path.exists(preview_path):
+            return preview
+        
+        # Aus der normalisierten Fassung rendern, falls vorhanden
+        source_path = os.path.join(SOUNDS_DIR, base + PROCESSED_SUFFIX)
+        if not os.path.exists(source_path):
+            source_path = os.path.join(SOUNDS_DIR, filename)
+        if not os.path.exists(source_path):
+            return None
+        
+        with self._preview_lock:
+            if not os.path.exists(preview_path):
+                try:
+                    render_preview(source_path, preview_path)
+                except Exception as e:
+                    print(f"Error rendering preview for {filename}: {e}")
+                    return None
+        return preview
+    
     def get_user_sounds(self, user_id):
         """Get all sounds uploaded by a user"""
         conn = get_db()
@@ -91,6 +251,9 @@ class SoundManager:
                 'filename': row['filename'],
                 'original_filename': row['original_filename'],
                 'filepath': os.path.join(SOUNDS_DIR, row['filename']),
+                'size': row['size'],
+                'duration_ms': row['duration_ms'],
+                'processing_status': row['processing_status'],
                 'uploaded_at': row['uploaded_at']
             })
         conn.close()
@@ -109,37 +272,45 @@ class SoundManager:
                 'original_filename': row['original_filename'],
                 'filepath': os.path.join(SOUNDS_DIR, row['filename']),
                 'user_id': row['user_id'],
+                'size': row['size'],
+                'duration_ms': row['duration_ms'],
+                'processing_status': row['processing_status'],
                 'uploaded_at': row['uploaded_at']
             })
         conn.close()
         return sounds
     
     def delete_sound(self, sound_id, user_id=None):
-        """Delete a sound file"""
-        conn = get_db()
-        cursor = conn.cursor()
-        
-        # Get sound info
-        if user_id:
-            cursor.execute('SELECT * FROM sounds WHERE id = ? AND user_id = ?', 
-                         (sound_id, user_id))
-        else:
-            cursor.execute('SELECT * FROM sounds WHERE id = ?', (sound_id,))
-        
-        row = cursor.fetchone()
-        if not row:
+        """Delete a sound (the file goes with its last reference)"""
+        with self._blob_lock:
+            conn = get_db()
+            cursor = conn.cursor()
+            
+            # Get sound info
+            if user_id:
+                cursor.execute('SELECT * FROM sounds WHERE id = ? AND user_id = ?', 
+                             (sound_id, user_id))
+            else:
+                cursor.execute('SELECT * FROM sounds WHERE id = ?', (sound_id,))
+            
+            row = cursor.fetchone()
+            if not row:
+                conn.close()
+                return False
+            
+            # Delete from database
+            cursor.execute('DELETE FROM sounds WHERE id = ?', (sound_id,))
+            cursor.execute('SELECT COUNT(*) FROM sounds WHERE filename = ?', (row['filename'],))
+            references = cursor.fetchone()[0]
+            conn.commit()
             conn.close()
-            return False
-        
-        # Delete file
-        filepath = os.path.join(SOUNDS_DIR, row['filename'])
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        
-        # Delete from database
-        cursor.execute('DELETE FROM sounds WHERE id = ?', (sound_id,))
-        conn.commit()
-        conn.close()
+            
+            # Delete file and its renditions when unreferenced
+            if references == 0:
+                preview = row['filename'].rsplit('.', 1)[0] + PREVIEW_SUFFIX
+                for filename in (row['filename'], row['processed_filename'], preview):
+                    filepath = os.path.join(SOUNDS_DIR, filename) if filename else None
+                    if filepath and os.path.exists(filepath):
+                        os.remove(filepath)
         
         return True
-
@@ -0,0 +1,109 @@
+"""
+Alarm tone synthesis
+
+Patterns are rendered once with NumPy into pygame Sound objects in the
+mixer's sample format and channel layout, cached by their parameters and
+looped by the mixer itself (no Python timing loop).
+"""
+import threading
+from sound_cache import load_pygame
+
+PATTERNS = ('beep', 'multi', 'chirp', 'pulsed', 'escalating')
+FADE_SECONDS = 0.005  # Kurzes Ein-/Ausblenden gegen Knacken
+
+# Mixer sample size -> NumPy dtype name
+SAMPLE_DTYPES = {-8: 'int8', 8: 'uint8', -16: 'int16', 16: 'uint16', -32: 'int32', 32: 'float32'}
+
+
+class ToneEngine:
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def render(self, pattern='beep', frequency=800, volume=0.8):
+        """Get the cached Sound for one loop period of a pattern"""
+        if pattern not in PATTERNS:
+            raise ValueError(f"Unknown tone pattern '{pattern}'. Available: {', '.join(PATTERNS)}")
+
+        pygame = load_pygame()
+        mixer = pygame.mixer.get_init() if pygame else None
+        if not mixer:
+            raise RuntimeError("pygame mixer not initialized")
+
+        key = (pattern, frequency, volume, mixer)
+        with self._lock:
+            sound = self._cache.get(key)
+            if sound is None:
+                samples = self._render_samples(pattern, frequency, mixer[0])
+                sound = self._to_sound(samples, volume, mixer)
+                self._cache[key] = sound
+            return sound
+
+    def _tone(self, frequency, seconds, sample_rate):
+        import numpy as np
+        t = np.arange(int(sample_rate * seconds), dtype=np.float32) / sample_rate
+        wave = np.sin(np.float32(2 * np.pi * frequency) * t)
+
+        # Ein-/Ausblenden
+        fade = min(int(sample_rate * FADE_SECONDS), len(wave) // 2)
+        if fade:
+            ramp = np.linspace(0, 1, fade, dtype=np.float32)
+            wave[:fade] *= ramp
+            wave[-fade:] *= ramp[::-1]
+        return wave
+
+    def _silence(self, seconds, sample_rate):
+        import numpy as np
+        return np.zeros(int(sample_rate * seconds), dtype=np.float32)
+
+    def _chirp(self, start, end, seconds, sample_rate):
+        import numpy as np
+        n = int(sample_rate * seconds)
+        frequencies = np.linspace(start, end, n, dtype=np.float64)
+        # Phasenkontinuierlich über die kumulierte Frequenz
+        phase = 2 * np.pi * np.cumsum(frequencies) / sample_rate
+        wave = np.sin(phase).astype(np.float32)
+        fade = min(int(sample_rate * FADE_SECONDS), n // 2)
+        if fade:
+            ramp = np.linspace(0, 1, fade, dtype=np.float32)
+            wave[:fade] *= ramp
+            wave[-fade:] *= ramp[::-1]
+        return wave
+
+    def _render_samples(self, pattern, frequency, sample_rate):
+        """Render one loop period as mono float32 samples in [-1, 1]"""
+        import numpy as np
+        tone = lambda f, s: self._tone(f, s, sample_rate)
+        silence = lambda s: self._silence(s, sample_rate)
+
+        if pattern in ('beep', 'escalating'):
+            # Lautstärke-Steigerung übernimmt der Mixer-Kanal (HardwareController)
+            parts = [tone(frequency, 0.4), silence(0.1)]
+        elif pattern == 'multi':
+            parts = [tone(frequency, 0.25), tone(frequency * 1.25, 0.25),
+                     tone(frequency * 1.5, 0.25), silence(0.25)]
+        elif pattern == 'chirp':
+            parts = [self._chirp(frequency / 2, frequency * 2, 0.5, sample_rate), silence(0.25)]
+        else:  # pulsed
+            parts = [tone(frequency, 0.08), silence(0.07)] * 3 + [silence(0.55)]
+
+        return np.concatenate(parts)
+
+    def _to_sound(self, samples, volume, mixer):
+        """Convert mono float samples to a Sound in the mixer's format and layout"""
+        import numpy as np
+        _, size, channels = mixer
+        dtype = np.dtype(SAMPLE_DTYPES.get(size, 'int16'))
+
+        samples = samples * np.float32(volume)
+        if dtype.kind == 'f':
+            data = samples.astype(dtype)
+        else:
+            info = np.iinfo(dtype)
+            amplitude = (int(info.max) - int(info.min)) / 2
+            offset = (int(info.max) + int(info.min) + 1) / 2
+            data = (samples * amplitude + offset).clip(info.min, info.max).astype(dtype)
+
+        if channels > 1:
+            data = np.ascontiguousarray(np.repeat(data[:, None], channels, axis=1))
+        return load_pygame().sndarray.make_sound(data)
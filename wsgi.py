@@ -0,0 +1,14 @@
+"""
+WSGI entry point, e.g. gunicorn -w 1 --threads 12 -b 0.0.0.0:5000 wsgi:app
+
+Initializes the managers and hardware and starts the background threads
+(alarm check, display, event writer) on import. Use a single worker process:
+every process would start its own alarm threads and ring the alarms twice.
+Each open /api/events stream holds a thread while connected (at most
+SSE_MAX_CONNECTIONS), so --threads must leave room for normal requests.
+"""
+from app import app, create_app, start_background_workers, print_startup_report
+
+create_app()
+start_background_workers()
+print_startup_report()